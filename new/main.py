@@ -4,7 +4,18 @@
 
 import pygame
 import os
+import sys
+import json
+import itertools
 import math
+import mmap
+import queue
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
 
 # core game loop for Chronicles of Time: handles movement, combat, UI, and progression.
 
@@ -19,6 +30,8 @@ GRID_HEIGHT = 3
 LEVELS = 3
 DEV_MODE = True # this is for debugging and adding invisible barriers so that we can see where they are
 DEV_SKIP_TO_LEVEL_2 = True  
+COOK_ASSETS = "--cook-assets" in sys.argv  # run `python main.py --cook-assets` to rebuild the asset pack
+CACHE_STATS = "--cache-stats" in sys.argv  # run `python main.py --cache-stats` to print image cache stats on exit
 # ------------ LEVEL 2 (CYBERPUNK) ------------
 LEVEL_2_NAME = "The Neon City (Cyberpunk Future)"
 LEVEL_2_BG_MAP = {               # (row,col) : filename  (no extension)
@@ -36,38 +49,156 @@ LEVEL_2_BG_MAP = {               # (row,col) : filename  (no extension)
 screen = pygame.display.set_mode((ROOM_WIDTH, ROOM_HEIGHT))
 pygame.display.set_caption("Chronicles of Time")
 clock = pygame.time.Clock()
-font = pygame.font.SysFont(None, 30)
-title_font = pygame.font.SysFont(None, 70)
-small_font = pygame.font.SysFont(None, 24)
-button_font = pygame.font.SysFont(None, 40)
+
+#  fonts and cached text
+font_registry = {}   # (face, size) -> Font, so each face/size is only loaded once
+TEXT_CACHE_SIZE = 512
+text_cache = OrderedDict()   # (font, text, color) -> rendered Surface, oldest first
+
+def get_font(size, face=None):
+    """Return the shared Font for a face and size, loading it on first use."""
+    key = (face, size)
+    cached = font_registry.get(key)
+    if cached is None:
+        cached = pygame.font.SysFont(face, size)
+        font_registry[key] = cached
+    return cached
+
+def render_text(text_font, text, color):
+    """Render antialiased text through an LRU cache so repeated strings are a lookup."""
+    key = (text_font, text, tuple(color))
+    rendered = text_cache.get(key)
+    if rendered is not None:
+        text_cache.move_to_end(key)
+        return rendered
+    rendered = text_font.render(text, True, color)
+    text_cache[key] = rendered
+    if len(text_cache) > TEXT_CACHE_SIZE:
+        text_cache.popitem(last=False)
+    return rendered
+
+font = get_font(30)
+title_font = get_font(70)
+small_font = get_font(24)
+button_font = get_font(40)
 POINTER_COLOR = (255, 215, 0)
 POINTER_SIZE = 12
 POINTER_OFFSET_X = -20
 
 # damgage zone
-damage_zones = []
-damage_timer = 0.0
 DAMAGE_INTERVAL = 1.0  
 
 #  player setup
-player = pygame.Rect(400, 400, 40, 50)  
-player_speed = 7
-current_room = [0, 0, 0]
-previous_room = tuple(current_room)
-player_direction = "right"  
+player_speed = 420   # px/s (7 px per frame at 60 FPS)
+PLAYER_BOOST_SPEED = 180   # extra px/s while the potion boost lasts
+
+#  projectiles
+OWNER_PLAYER = 0   # bullets
+OWNER_BOSS = 1     # thrown axes
+
+class ProjectileStore:
+    """Struct-of-arrays projectile pool; live projectiles are packed into the first `count` rows."""
+
+    FIELDS = {
+        "pos": ((2,), np.float64),
+        "prev": ((2,), np.float64),         # position at the start of the last tick
+        "vel": ((2,), np.float64),          # px/s
+        "angle": ((), np.float64),
+        "prev_angle": ((), np.float64),
+        "spin": ((), np.float64),           # degrees/s
+        "damage": ((), np.int32),
+        "owner": ((), np.int8),
+        "alive": ((), np.bool_),
+    }
+
+    def __init__(self, capacity=64):
+        self.count = 0
+        self._resize(capacity)
+
+    def __len__(self):
+        return self.count
+
+    def _resize(self, capacity):
+        for name, (shape, dtype) in self.FIELDS.items():
+            grown = np.zeros((capacity,) + shape, dtype=dtype)
+            if self.count:
+                grown[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, grown)
+
+    def spawn(self, x, y, vx, vy, damage, owner, spin=0.0):
+        """Append a projectile, doubling the arrays when they are full."""
+        if self.count == len(self.alive):
+            self._resize(len(self.alive) * 2)
+        i = self.count
+        self.pos[i] = self.prev[i] = (x, y)
+        self.vel[i] = (vx, vy)
+        self.angle[i] = self.prev_angle[i] = 0.0
+        self.spin[i] = spin
+        self.damage[i] = damage
+        self.owner[i] = owner
+        self.alive[i] = True
+        self.count += 1
+
+    def owned_by(self, owner):
+        """Indices of the live projectiles fired by owner."""
+        return np.flatnonzero(self.owner[:self.count] == owner)
+
+    def advance(self, indices, dt_sec):
+        """Move and spin a batch of projectiles by one step."""
+        self.pos[indices] += self.vel[indices] * dt_sec
+        self.angle[indices] += self.spin[indices] * dt_sec
+
+    def cull(self, indices, margin):
+        """Kill projectiles that left the room (plus margin) and return the survivors."""
+        x, y = self.pos[indices, 0], self.pos[indices, 1]
+        outside = (x < -margin) | (x > ROOM_WIDTH + margin) | (y < -margin) | (y > ROOM_HEIGHT + margin)
+        self.alive[indices[outside]] = False
+        return indices[~outside]
+
+    def hits_rect(self, indices, half_w, half_h, rect):
+        """Mask of the projectiles whose (2*half_w x 2*half_h) box overlaps rect, with Rect's truncation."""
+        left = np.trunc(self.pos[indices, 0] - half_w)
+        top = np.trunc(self.pos[indices, 1] - half_h)
+        return ((left < rect.right) & (left + 2 * half_w > rect.left) &
+                (top < rect.bottom) & (top + 2 * half_h > rect.top) & self.alive[indices])
+
+    def compact(self):
+        """Swap-remove dead projectiles: survivors from the tail move into the holes."""
+        n = self.count
+        alive = self.alive[:n]
+        k = int(np.count_nonzero(alive))
+        if k == n:
+            return
+        holes = np.flatnonzero(~alive[:k])
+        movers = k + np.flatnonzero(alive[k:])
+        for name in self.FIELDS:
+            array = getattr(self, name)
+            array[holes] = array[movers]
+        self.count = k
+
+    def clear(self, owner):
+        """Drop every projectile fired by owner."""
+        self.alive[self.owned_by(owner)] = False
+        self.compact()
+
+    def store_previous(self):
+        n = self.count
+        self.prev[:n] = self.pos[:n]
+        self.prev_angle[:n] = self.angle[:n]
+
+    def interpolated(self, owner, alpha):
+        """Positions and angles of owner's projectiles blended between the last two ticks."""
+        indices = self.owned_by(owner)
+        pos = self.prev[indices] + (self.pos[indices] - self.prev[indices]) * alpha
+        angle = self.prev_angle[indices] + (self.angle[indices] - self.prev_angle[indices]) * alpha
+        return pos, angle
 
 # weapon system
-bullets = []
-ammo = 0  
 max_ammo = 30
-reload_time = 0.0
-is_reloading = False
-player_angle = 0.0
-shoot_cooldown = 0.0
-has_weapon = False  
+BULLET_SPEED = 937.5   # px/s (15 px per 16 ms)
 
 #  shop items
-blacksmith_items = {
+BLACKSMITH_ITEMS = {
     "weapon": {
         "name": "Basic Firearm",
         "description": "",
@@ -113,7 +244,90 @@ upgrade_costs = {
 
 #  simple image loading with caching and placeholders
 ASSETS_DIR = "assets"
-image_cache = {}
+IMAGE_CACHE_BUDGET_MB = 32   # roughly a dozen 800x800 backgrounds
+
+class ImageCache:
+    """Byte-budgeted LRU of decoded surfaces that never evicts pinned keys."""
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.decode_ms = {}          # cache key -> time spent decoding it
+        self._entries = OrderedDict()  # cache key -> (surface, bytes), oldest first
+        self._pinned = set()
+        self._lock = threading.RLock()  # the prefetch worker fills the cache too
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return a cached surface and mark it as just drawn, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, surface, decode_ms=None):
+        """Store a surface unless another thread already did, then trim to budget."""
+        with self._lock:
+            if key in self._entries:
+                return self._entries[key][0]
+            size = surface.get_width() * surface.get_height() * surface.get_bytesize()
+            self._entries[key] = (surface, size)
+            self.resident_bytes += size
+            if decode_ms is not None:
+                self.decode_ms[key] = decode_ms
+            self._evict()
+            return surface
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.resident_bytes -= entry[1]
+
+    def pin(self, keys):
+        """Protect exactly these keys from eviction (the current room's assets)."""
+        with self._lock:
+            self._pinned = set(keys)
+            self._evict()
+
+    def _evict(self):
+        for key in list(self._entries):
+            if self.resident_bytes <= self.budget_bytes:
+                break
+            if key in self._pinned:
+                continue
+            self.resident_bytes -= self._entries.pop(key)[1]
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "resident_bytes": self.resident_bytes,
+                "budget_bytes": self.budget_bytes,
+                "decode_ms": dict(self.decode_ms),
+            }
+
+image_cache = ImageCache(IMAGE_CACHE_BUDGET_MB * 1024 * 1024)
+atlas_pages = []
+atlas_sprites = {}   # cache key -> subsurface view into one of the atlas pages
+AXE_SIZE = (90, 50)
 
 def _placeholder_color(name: str):
     """Pick a sensible placeholder color based on asset name."""
@@ -178,28 +392,145 @@ def _auto_transparent_bg(img):
         img = img.convert_alpha()
     return img
 
+def _image_cache_key(name, width=None, height=None):
+    return f"{name}_{width}x{height}" if width and height else name
+
+#  cooked asset pack
+# layout: magic, u32 index length, json index, then raw pixels (display byte order) per entry
+COOKED_PACK_PATH = os.path.join(ASSETS_DIR, "cooked.pack")
+COOKED_PACK_MAGIC = b"CTPK1"
+COOKED_PACK_ALIGN = 16
+cooked_pack = None   # {"file", "map", "index"} while a pack is mapped
+
+def _source_stamp(name):
+    """Return the (mtime_ns, size) of a source asset, or None if it is missing."""
+    try:
+        st = os.stat(os.path.join(ASSETS_DIR, name))
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _native_pixel_format():
+    """Byte order of display-ready alpha surfaces, so packed pixels blit without conversion."""
+    masks = pygame.Surface((1, 1), pygame.SRCALPHA).convert_alpha().get_masks()
+    if masks[:3] == (0xFF0000, 0xFF00, 0xFF):
+        return "BGRA"
+    return "RGBA"
+
+def open_cooked_pack(path=COOKED_PACK_PATH):
+    """Memory-map the cooked asset pack if one exists and is readable."""
+    global cooked_pack
+    try:
+        pack_file = open(path, "rb")
+    except OSError:
+        return False
+    try:
+        pack_map = mmap.mmap(pack_file.fileno(), 0, access=mmap.ACCESS_COPY)
+        header_size = len(COOKED_PACK_MAGIC) + 4
+        if pack_map[:len(COOKED_PACK_MAGIC)] != COOKED_PACK_MAGIC:
+            raise ValueError("not a cooked asset pack")
+        (index_length,) = struct.unpack_from("<I", pack_map, len(COOKED_PACK_MAGIC))
+        index = json.loads(pack_map[header_size:header_size + index_length].decode("utf-8"))
+        if index["format"] != _native_pixel_format():
+            raise ValueError("pack was cooked for a different pixel format")
+    except (ValueError, KeyError, OSError, struct.error):
+        pack_file.close()
+        return False
+    cooked_pack = {"file": pack_file, "map": pack_map, "index": index}
+    return True
+
+def _pack_surface(name, width, height):
+    """Build a surface straight from the mapped pack, or None if missing or stale."""
+    if cooked_pack is None or not (width and height):
+        return None
+    entry = cooked_pack["index"]["entries"].get(_image_cache_key(name, width, height))
+    if entry is None:
+        return None
+    if _source_stamp(name) != (entry["mtime_ns"], entry["size"]):
+        return None   # source art changed since cooking, decode it the slow way
+    pixels = memoryview(cooked_pack["map"])[entry["offset"]:entry["offset"] + entry["length"]]
+    return pygame.image.frombuffer(pixels, (width, height), cooked_pack["index"]["format"])
+
+def cook_asset_pack(requests, path=COOKED_PACK_PATH):
+    """Decode, alpha-resolve and scale every requested asset into one pack file."""
+    pixel_format = _native_pixel_format()
+    index = {}
+    blobs = []
+    offset = 0
+    for name, width, height in sorted(set(requests)):
+        stamp = _source_stamp(name)
+        if stamp is None:
+            continue
+        img = _decode_image(name, width, height)
+        pixels = pygame.image.tobytes(img, pixel_format)
+        index[_image_cache_key(name, width, height)] = {
+            "offset": offset, "length": len(pixels),
+            "mtime_ns": stamp[0], "size": stamp[1],
+        }
+        padding = -len(pixels) % COOKED_PACK_ALIGN
+        blobs.append(pixels + b"\0" * padding)
+        offset += len(pixels) + padding
+
+    # offsets so far are relative to the pixel block, rebase them past the header;
+    # the index grows as offsets gain digits so repeat until the block start settles
+    header_size = len(COOKED_PACK_MAGIC) + 4
+    data_start = header_size
+    while True:
+        rebased = {key: dict(entry, offset=entry["offset"] + data_start) for key, entry in index.items()}
+        index_bytes = json.dumps({"format": pixel_format, "entries": rebased}).encode("utf-8")
+        needed = header_size + len(index_bytes)
+        needed += -needed % COOKED_PACK_ALIGN
+        if needed <= data_start:
+            break
+        data_start = needed
+    index_bytes += b" " * (data_start - header_size - len(index_bytes))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(COOKED_PACK_MAGIC)
+        f.write(struct.pack("<I", len(index_bytes)))
+        f.write(index_bytes)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp_path, path)
+    return len(index)
+
+if not COOK_ASSETS:
+    open_cooked_pack()
+
+def _decode_image(name, width=None, height=None):
+    """Decode and scale an asset from disk, or return None if it is missing."""
+    packed = _pack_surface(name, width, height)
+    if packed is not None:
+        return packed
+
+    filepath = os.path.join(ASSETS_DIR, name)
+    if not os.path.exists(filepath):
+        return None
+    try:
+        img = pygame.image.load(filepath).convert_alpha() # this makes sure that all images load properly
+    except:
+        img = _auto_transparent_bg(pygame.image.load(filepath).convert())
+    else:
+        img = _auto_transparent_bg(img)
+
+    if width and height:
+        img = pygame.transform.scale(img, (width, height))
+    return img
+
 def load_image(name, width=None, height=None):
     """Image loader with caching and readable placeholders."""
-    cache_key = f"{name}_{width}x{height}" if width and height else name
+    cache_key = _image_cache_key(name, width, height)
     
-    if cache_key in image_cache:
-        return image_cache[cache_key]
+    cached = image_cache.get(cache_key)
+    if cached is not None:
+        return cached
     
     try:
-        filepath = os.path.join(ASSETS_DIR, name)
-        if os.path.exists(filepath):
-           
-            try:
-                img = pygame.image.load(filepath).convert_alpha() # this makes sure that all images load properly
-            except:
-                img = _auto_transparent_bg(pygame.image.load(filepath).convert())
-            else:
-                img = _auto_transparent_bg(img)
-            
-            if width and height:
-                img = pygame.transform.scale(img, (width, height))
-            image_cache[cache_key] = img
-            return img
+        start = time.perf_counter()
+        img = _decode_image(name, width, height)
+        if img is not None:
+            return image_cache.put(cache_key, img, (time.perf_counter() - start) * 1000.0)
     except:
         pass
 
@@ -207,8 +538,8 @@ def load_image(name, width=None, height=None):
     fallback = create_placeholder(name, width, height)
     try:
         image_name = name.split('/')[-1].split('.')[0]
-        label_font = pygame.font.SysFont(None, max(12, min(20, fallback.get_width() // 5)))
-        text = label_font.render(image_name, True, (255, 255, 255))
+        label_font = get_font(max(12, min(20, fallback.get_width() // 5)))
+        text = render_text(label_font, image_name, (255, 255, 255))
         text_rect = text.get_rect(center=(fallback.get_width() // 2, fallback.get_height() // 2))
         bg_rect = text_rect.inflate(10, 5)
         pygame.draw.rect(fallback, (0, 0, 0, 180), bg_rect)
@@ -216,52 +547,63 @@ def load_image(name, width=None, height=None):
         fallback.blit(text, text_rect)
     except:
         pass
-    image_cache[cache_key] = fallback
-    return fallback
+    return image_cache.put(cache_key, fallback)
+
+LEVEL_1_BG_MAP = {
+    (0, 0): "village",
+    (0, 1): "blacksmith",
+    (0, 2): "forestPath",
+    (1, 0): "goblincamp",
+    (1, 1): "castlebridge",
+    (1, 2): "UpdatedCastleCourt",
+    (2, 0): "throneroom",
+    (2, 1): "library",
+    (2, 2): "portalUpdated1",
+}
 
-def load_smart_bg(level, row, col):
-    """Return Surface for any level, or None if no file."""
-    if level == 0:   # your existing level-1 map
-        background_mapping = {
-            (0, 0, 0): "village",
-            (0, 0, 1): "blacksmith",
-            (0, 0, 2): "forestPath",
-            (0, 1, 0): "goblincamp",
-            (0, 1, 1): "castlebridge",
-            (0, 1, 2): "UpdatedCastleCourt",
-            (0, 2, 0): "throneroom",
-            (0, 2, 1): "library",
-            (0, 2, 2): "portalUpdated1",
-        }
-        room_type = background_mapping.get((level, row, col))
-        if room_type:
-            return load_image(f"backgrounds/{room_type}.png", ROOM_WIDTH, ROOM_HEIGHT)
-        return None
+def background_asset(level, row, col):
+    """Return the background asset path for a room, or None if it has none."""
+    if level == 0:
+        filename = LEVEL_1_BG_MAP.get((row, col))
     elif level == 1:   # ------------- LEVEL 2 -------------
         filename = LEVEL_2_BG_MAP.get((row, col))
-        if filename:
-            return load_image(f"backgrounds/{filename}.png", ROOM_WIDTH, ROOM_HEIGHT)
-        return None
+    else:
+        filename = None
+    return f"backgrounds/{filename}.png" if filename else None
+
+def load_smart_bg(level, row, col):
+    """Return Surface for any level, or None if no file."""
+    name = background_asset(level, row, col)
+    if name:
+        return load_image(name, ROOM_WIDTH, ROOM_HEIGHT)
     return None
 
+def load_sprite(name, width, height):
+    """Return a packed atlas view for a sprite, loading it normally otherwise."""
+    sprite = atlas_sprites.get(_image_cache_key(name, width, height))
+    if sprite is not None:
+        return sprite
+    return load_image(name, width, height)
+
 def load_player_image(direction="right"):
     """Load player sprite based on direction (only left/right supported)."""
-    return load_image(f"characters/player_{direction}.png", 40, 50)
+    return load_sprite(f"characters/player_{direction}.png", 40, 50)
 
 def load_object_image(obj_type, width, height):
-    return load_image(f"objects/{obj_type}.png", width, height)
+    return load_sprite(f"objects/{obj_type}.png", width, height)
+
+def get_item_size(item_type):
+    """Return sprite size for items, with larger keys, gold, and herbs."""
+    if item_type in ["key", "gold", "herb"]:
+        return (45, 45)
+    elif item_type == "timeshard":
+        return (50, 50)
+    return (25, 25)
 
 def load_item_image(item_type):
     """Load items with larger size for keys, gold, and herbs."""
-    if item_type == "key":
-        return load_image(f"items/{item_type}.png", 45, 45)  
-    elif item_type == "gold":
-        return load_image(f"items/{item_type}.png", 45, 45)  
-    elif item_type == "herb":
-        return load_image(f"items/{item_type}.png", 45, 45)  
-    elif item_type == "timeshard":
-        return load_image(f"items/{item_type}.png", 50, 50)  
-    return load_image(f"items/{item_type}.png", 25, 25)
+    size = get_item_size(item_type)
+    return load_sprite(f"items/{item_type}.png", size[0], size[1])
 
 def get_npc_size(npc_type):
     """Return sprite size overrides for specific NPCs."""
@@ -277,23 +619,124 @@ def get_npc_size(npc_type):
 
 def load_npc_image(npc_type):
     size = get_npc_size(npc_type)
-    return load_image(f"npcs/{npc_type}.png", size[0], size[1])
+    return load_sprite(f"npcs/{npc_type}.png", size[0], size[1])
 
 def load_axe_image():
     """Load the boss axe image."""
-    return load_image("npcs/axe.png", 90, 50) 
+    return load_sprite("npcs/axe.png", AXE_SIZE[0], AXE_SIZE[1])
+
+#  rotated sprite cache
+ROTATION_STEP = 5   # degrees; angles snap to this so each sprite has at most 72 rotations
+rotation_cache = {}   # (source surface, snapped angle, flip_x) -> transformed surface
+
+def rotated_sprite(img, angle, flip_x=False):
+    """Return img rotated counter-clockwise by angle (and optionally mirrored), cached."""
+    snapped = int(round(angle / ROTATION_STEP)) * ROTATION_STEP % 360
+    key = (img, snapped, flip_x)
+    rotated = rotation_cache.get(key)
+    if rotated is None:
+        rotated = pygame.transform.rotate(img, snapped)
+        if flip_x:
+            rotated = pygame.transform.flip(rotated, True, False)
+        rotation_cache[key] = rotated
+    return rotated
+
+def prewarm_rotations(img, flip_x=False):
+    """Generate every snapped rotation of img up front so later frames only blit."""
+    for angle in range(0, 360, ROTATION_STEP):
+        rotated_sprite(img, angle, flip_x)
 
 #  game state
-health = 100
-max_health = 100
-weapon_level = 1
-armor_level = 0
+class GameState:
+    """Everything a play session changes, handed to the update and draw functions."""
+
+    __slots__ = ("player", "player_direction", "current_room", "previous_room", "player_remainder", "player_prev",
+                 "health", "max_health", "weapon_level", "armor_level", "damage_timer", "goblin_contact_cooldown",
+                 "player_speed_boost_timer", "projectiles", "ammo", "reload_time", "is_reloading", "shoot_cooldown",
+                 "has_weapon", "inventory", "quests", "quest_log_revision", "collected_items", "blacksmith_items",
+                 "safe_input", "safe_unlocked", "safe_visible", "maze_visible", "maze_completed", "maze_player_pos",
+                 "knight_rescued", "boss", "boss_initialized", "boss_defeated", "boss_drop_collected", "goblin_rooms", "active_room",
+                 "nearby_triggers", "mode", "hud_visible", "map_visible", "quest_log_visible", "dialogue_active",
+                 "current_dialogue", "dialogue_index", "upgrade_shop_visible", "message", "message_timer",
+                 "message_color", "play_button_hover", "how_to_button_hover", "about_button_hover",
+                 "back_button_hover", "sim_accumulator", "render_alpha")
+
+    def __init__(self):
+        #  player
+        self.player = pygame.Rect(400, 400, 40, 50)
+        self.player_direction = "right"
+        self.current_room = [0, 0, 0]
+        self.previous_room = tuple(self.current_room)
+        self.player_remainder = [0.0, 0.0]   # sub-pixel part of the player's float position
+        self.player_prev = (float(self.player.x), float(self.player.y))   # player position at the start of the last tick
+        self.health = 100
+        self.max_health = 100
+        self.weapon_level = 1
+        self.armor_level = 0
+        self.damage_timer = 0.0
+        self.goblin_contact_cooldown = 0.0
+        self.player_speed_boost_timer = 0.0
+
+        #  weapon
+        self.projectiles = ProjectileStore()
+        self.ammo = 0
+        self.reload_time = 0.0
+        self.is_reloading = False
+        self.shoot_cooldown = 0.0
+        self.has_weapon = False
+
+        #  progress
+        self.inventory = dict(STARTING_INVENTORY)
+        self.quests = {quest_id: dict(quest) for quest_id, quest in QUESTS.items()}
+        self.quest_log_revision = next(quest_log_revisions)   # renewed by the quest bus, so the log only rebuilds when a quest actually changed
+        self.collected_items = {}   # room key -> bitset of picked-up item ids (bit n set = item n is gone)
+        self.blacksmith_items = {item_id: dict(item) for item_id, item in BLACKSMITH_ITEMS.items()}
+
+        #  puzzles
+        self.safe_input = ""
+        self.safe_unlocked = False
+        self.safe_visible = False
+        self.maze_visible = False
+        self.maze_completed = False
+        self.maze_player_pos = [1, 1]
+
+        #  world
+        self.knight_rescued = False   # picks which compiled variant of the knight's room this session sees
+        self.boss = None
+        self.boss_initialized = False
+        self.boss_defeated = False
+        self.boss_drop_collected = False
+        self.goblin_rooms = new_goblin_rooms()
+        self.active_room = get_room(self.current_room, self.knight_rescued)   # refreshed every tick and before every gameplay frame
+        self.nearby_triggers = []   # triggers the player stands in, kept up to date by enter/exit events
+
+        #  UI
+        self.mode = "main_menu"
+        self.hud_visible = False
+        self.map_visible = False
+        self.quest_log_visible = False
+        self.dialogue_active = False
+        self.current_dialogue = []
+        self.dialogue_index = 0
+        self.upgrade_shop_visible = False
+        self.message = ""
+        self.message_timer = 0.0
+        self.message_color = (255, 255, 255)
+        self.play_button_hover = False
+        self.how_to_button_hover = False
+        self.about_button_hover = False
+        self.back_button_hover = False
+
+        #  fixed-timestep clock
+        self.sim_accumulator = 0.0   # real time not yet simulated, in ms
+        self.render_alpha = 1.0      # where the renderer sits between the previous and the latest tick
+
 GOBLIN_CONTACT_DAMAGE = 10
-goblin_contact_cooldown = 0.0  
-player_speed_boost_timer = 0.0  
+GOBLIN_SEPARATION = 45         # px between goblin centres before they start shoving apart
+GOBLIN_SEPARATION_SPEED = 90   # px/s push at full overlap
 
 #  inventory system
-inventory = {
+STARTING_INVENTORY = {
     "Gold": 50,
     "Health Potions": 3,
     "Herbs": 0,
@@ -302,36 +745,81 @@ inventory = {
 }
 
 #  quest system
-quests = {
-    "talk_to_elder": {"active": True, "complete": False, "description": "Talk to Elder Rowan"},
-    "buy_weapon": {"active": False, "complete": False, "description": "Buy a weapon from the Blacksmith (20 Gold)"},
-    "upgrade_sword": {"active": False, "complete": False, "description": "Upgrade your weapon at the Blacksmith"},
-    "upgrade_armor": {"active": False, "complete": False, "description": "Upgrade your armor at the Blacksmith"},
-    "collect_herbs": {"active": False, "complete": False, "description": "Collect 3 Herbs from Forest"},
-    "rescue_knight": {"active": False, "complete": False, "description": "Rescue Knight Aelric"},
-    "solve_drawbridge": {"active": False, "complete": False, "description": "Solve Drawbridge Puzzle"},
-    "defeat_goblin_king": {"active": False, "complete": False, "description": "Defeat the Goblin King"},
-    "find_shard_1": {"active": False, "complete": False, "description": "Find First Time Shard"},
+# requires: quests that must be complete before this one activates (quests without any keep their initial state);
+# completes_on: game events (kind, subject) that complete it
+QUESTS = {
+    "talk_to_elder": {"active": True, "complete": False, "description": "Talk to Elder Rowan",
+                      "requires": (), "completes_on": (("talk", "elder"),)},
+    "buy_weapon": {"active": False, "complete": False, "description": "Buy a weapon from the Blacksmith (20 Gold)",
+                   "requires": ("talk_to_elder",), "completes_on": (("purchase", "weapon"),)},
+    "upgrade_sword": {"active": False, "complete": False, "description": "Upgrade your weapon at the Blacksmith",
+                      "requires": ("buy_weapon",), "completes_on": ()},
+    "upgrade_armor": {"active": False, "complete": False, "description": "Upgrade your armor at the Blacksmith",
+                      "requires": (), "completes_on": ()},
+    "collect_herbs": {"active": False, "complete": False, "description": "Collect 3 Herbs from Forest",
+                      "requires": (), "completes_on": (("give", "herbcollector"),)},
+    "rescue_knight": {"active": False, "complete": False, "description": "Rescue Knight Aelric",
+                      "requires": (), "completes_on": (("rescue", "knight"),)},
+    "solve_drawbridge": {"active": False, "complete": False, "description": "Solve Drawbridge Puzzle",
+                         "requires": (), "completes_on": (("solve", "drawbridge"),)},
+    "defeat_goblin_king": {"active": False, "complete": False, "description": "Defeat the Goblin King",
+                           "requires": ("rescue_knight",), "completes_on": (("pickup", "goblin_king_drop"),)},
+    "find_shard_1": {"active": False, "complete": False, "description": "Find First Time Shard",
+                     "requires": (), "completes_on": (("pickup", "goblin_king_drop"),)},
 }
 
+def build_quest_graph():
+    """Index quests by the events that complete them and by the quests waiting on them."""
+    listeners, dependents = {}, {}
+    for quest_id, quest in QUESTS.items():
+        for event in quest["completes_on"]:
+            listeners.setdefault(event, []).append(quest_id)
+        for required in quest["requires"]:
+            dependents.setdefault(required, []).append(quest_id)
+    return listeners, dependents
+
+quest_listeners, quest_dependents = build_quest_graph()
+quest_subscribers = []   # callbacks taking the session and the list of quest ids that just changed
+quest_log_revisions = itertools.count()   # shared by every session, so two never hold the same revision
+
+def subscribe_quests(callback):
+    quest_subscribers.append(callback)
+
+def complete_quest(state, quest_id, changed):
+    """Complete a quest and activate the dependents it unblocks, recording every quest touched."""
+    quests = state.quests
+    quest = quests[quest_id]
+    if quest["complete"]:
+        return
+    quest["complete"] = True
+    changed.append(quest_id)
+    for dependent_id in quest_dependents.get(quest_id, ()):
+        dependent = quests[dependent_id]
+        if not dependent["active"] and all(quests[q]["complete"] for q in dependent["requires"]):
+            dependent["active"] = True
+            changed.append(dependent_id)
+
+def publish(state, kind, subject):
+    """Feed a game event to the quests listening for it and tell subscribers if anything changed."""
+    changed = []
+    for quest_id in quest_listeners.get((kind, subject), ()):
+        complete_quest(state, quest_id, changed)
+    if changed:
+        for callback in quest_subscribers:
+            callback(state, changed)
+
 
 #   collected items tracking
-collected_gold = set()
-collected_herbs = set()
-collected_potions = set()
-collected_keys = set()
-collected_timeshards = set()
+def collected_mask(state, room_key):
+    return state.collected_items.get(tuple(room_key), 0)
+
+def collect_item(state, room_key, item):
+    state.collected_items[tuple(room_key)] = collected_mask(state, room_key) | (1 << item.id)
 
 #  safe system
 safe_code = "4231" 
-safe_input = ""
-safe_unlocked = False
-safe_visible = False
 
 # maze system
-maze_visible = False
-maze_completed = False
-maze_player_pos = [1, 1]  
 maze_exit_pos = [9, 9]    
 maze_cell_size = 40
 maze_width = 11
@@ -352,42 +840,100 @@ maze_layout = [
 ]
 
 #  boss system
-boss = None
-boss_health = 0
-boss_max_health = 0
-boss_attack_cooldown = 0
-boss_axe = None
-boss_axe_angle = 0
-boss_axe_swinging = False
-boss_axe_damage = 40  
-boss_defeated = False
-boss_drop_collected = False
-boss_phase = 1  
-boss_thrown_axes = []  
-boss_throw_cooldown = 0
-
-#  UI & game state flags
-game_state = "main_menu" 
-on_home = True
-hud_visible = False
-map_visible = False
-quest_log_visible = False
-dialogue_active = False
-current_dialogue = []
-dialogue_index = 0
-upgrade_shop_visible = False
-in_combat = False
-combat_enemies = []
-give_herbs_active = False  
-
-#  messages
-message = ""
-message_timer = 0.0
-message_color = (255, 255, 255)
+BOSS_SWING_SPEED = 480   # degrees/s (8 per frame at 60 FPS)
+THROWN_AXE_SPIN = 600    # degrees/s (10 per frame at 60 FPS)
+THROWN_AXE_SPEED = 400   # px/s
+THROWN_AXE_DAMAGE = 40   # before armor
+
+# what makes each boss different; phases after the first begin once health drops to "at" of max
+BOSS_KINDS = {
+    "goblin_king": {
+        "name": "Goblin King",
+        "sprite": "boss1",
+        "spawn": (350, 300, 100, 120),
+        "health": 4,        # times the player's max health
+        "speed": 300,       # px/s
+        "sight": 400,       # px; only chases a player it can see within this range
+        "margin": 100,      # keeps this far from the room's edges
+        "swing": {"range": 180, "radius": 90, "size": (80, 40), "arc": 180, "speed": BOSS_SWING_SPEED, "damage": 40},
+        "throw": {"min_range": 200, "speed": THROWN_AXE_SPEED, "spin": THROWN_AXE_SPIN, "damage": THROWN_AXE_DAMAGE},
+        "phases": [
+            {"swing_cooldown": 2.5, "swing_bonus": 0, "throw_cooldown": None},
+            {"at": 0.5, "swing_cooldown": 2.0, "swing_bonus": 10, "throw_cooldown": 3.0,
+             "message": "The Goblin King enters Phase 2! He's faster and throws axes!"},
+        ],
+    },
+}
+
+# each state: whether the boss keeps chasing while in it, what it does every tick, and
+# (condition, next state) pairs checked in order at the start of the tick
+BOSS_STATES = {
+    "idle": {"moves": False, "tick": None, "transitions": [("can_swing", "swing"), ("can_throw", "throw"), ("sees_player", "chase")]},
+    "chase": {"moves": True, "tick": None, "transitions": [("can_swing", "swing"), ("can_throw", "throw"), ("lost_player", "idle")]},
+    "swing": {"moves": True, "tick": "swing", "transitions": []},
+    "throw": {"moves": True, "tick": "throw", "transitions": []},
+    "phase_transition": {"moves": True, "tick": None, "transitions": [("always", "chase")]},
+}
+
+class Boss:
+    """A boss's body and fight state, driven by its BOSS_KINDS entry through BOSS_STATES."""
+    __slots__ = ("kind", "spec", "rect", "pos", "prev", "alive", "last_direction", "state", "health", "max_health",
+                 "phase", "swing_cooldown", "throw_cooldown", "axe_angle", "axe_prev_angle", "hitboxes")
+
+    def __init__(self):
+        self.rect = pygame.Rect(0, 0, 0, 0)
+
+    def reset(self, kind, player_max_health):
+        """Place the boss for a fresh fight, reusing the same object and rect."""
+        spec = BOSS_KINDS[kind]
+        x, y, w, h = spec["spawn"]
+        self.kind = kind
+        self.spec = spec
+        self.rect.update(x, y, w, h)
+        self.pos = [float(x), float(y)]   # float position, the rect is rounded from it
+        self.prev = (float(x), float(y))  # position at the start of the last tick
+        self.alive = True
+        self.last_direction = "right"
+        self.state = "idle"
+        self.max_health = player_max_health * spec["health"]
+        self.health = self.max_health
+        self.phase = 1
+        self.swing_cooldown = 0
+        self.throw_cooldown = 0
+        self.axe_angle = 0
+        self.axe_prev_angle = 0   # swing angle at the start of the last tick, for interpolation
+        self.hitboxes = swing_hitboxes(kind)
+
+    @property
+    def phase_spec(self):
+        return self.spec["phases"][self.phase - 1]
+
+    @property
+    def swinging(self):
+        return self.state == "swing"
+
+boss_swing_tables = {}   # boss kind -> {"right": [Rect per degree], "left": [...]}
+
+def swing_hitboxes(kind):
+    """Axe hitboxes for every whole degree of a boss's swing, as offsets from its centre, per facing."""
+    table = boss_swing_tables.get(kind)
+    if table is None:
+        swing = BOSS_KINDS[kind]["swing"]
+        radius, (w, h) = swing["radius"], swing["size"]
+        table = {"right": [], "left": []}
+        for angle in range(swing["arc"] + 1):
+            dx = round(radius * math.cos(math.radians(angle)), 9)   # so sin(30) * 90 floors to 45, not 44
+            dy = round(radius * math.sin(math.radians(angle)), 9)
+            # the boss centre is a whole pixel, so flooring the offset matches Rect truncating the sum
+            table["right"].append(pygame.Rect(math.floor(dx - w / 2), math.floor(dy - h / 2), w, h))
+            table["left"].append(pygame.Rect(math.floor(-dx - w / 2), math.floor(dy - h / 2), w, h))
+        boss_swing_tables[kind] = table
+    return table
 
 #  npc dialogues
+# dialogue lines keyed by (room, speaker, variant)
 npc_dialogues = {
-    (0, 0, 0, "elder"): [
+    ((0, 0, 0), "elder", "default"): [
         "Elder Rowan: Welcome, brave Arin!",
         "Elder Rowan: The Time Shards have been scattered across eras.",
         "Elder Rowan: You'll need protection for your journey.",
@@ -396,24 +942,18 @@ npc_dialogues = {
         "Elder Rowan: He also offers armor and weapon upgrades for your journey.",
         "Quest Updated: Visit the Blacksmith to buy a weapon"
     ],
-    (0, 1, 0, "knight"): [  
+    ((0, 1, 0), "knight", "default"): [  
         "Knight Aelric: Please, help me! I'm trapped in this cage!",
         "Knight Aelric: The goblins captured me after the battle.",
         "Knight Aelric: There's a lock mechanism on the cage - can you solve it?",
         "Hint: Interact with the cage to try the lock puzzle"
     ],
-    (0, 1, 0, "knight_rescued"): [  
-        "Knight Aelric: Thank you for rescuing me!",
-        "Knight Aelric: The Goblin King holds the first Time Shard.",
-        "Knight Aelric: I dropped my key when they captured me - you should find it nearby.",
-        "Quest Updated: Defeat the Goblin King"
-    ],
-    (0, 2, 1, "herbcollector"): [
+    ((0, 2, 1), "herbcollector", "default"): [
         "Herb Collector: Ah, a traveler! I collect rare herbs from the forest.",
         "Herb Collector: If you bring me 3 herbs, I can give you something useful.",
         "Herb Collector: I know the combination to the safe in this room."
     ],
-    (0, 2, 1, "herbcollector_with_herbs"): [
+    ((0, 2, 1), "herbcollector", "with_herbs"): [
         "Herb Collector: Wonderful! You found the herbs!",
         "Herb Collector: As promised, here's the safe combination: 4231",
         "Herb Collector: The safe contains something valuable for your journey.",
@@ -421,14 +961,180 @@ npc_dialogues = {
     ],
 }
 
-#   colliders
-colliders = []
-gold_items = []
-herbs = []
-potions = []
-npcs = []
-interactive_objects = []
-goblin_rooms = {}
+PORTAL_KEYS = 2   # keys needed to open the portal to the Neon City
+
+# what F ("use") and G ("give") do next to each target: (verb, room, target, state, effects).
+# target is an NPC id or a prop type; state comes from INTERACTION_STATES (default "default");
+# effects run in order, see INTERACTION_EFFECTS
+INTERACTIONS = [
+    ("use", (0, 0, 0), "elder", "new", [("dialogue", "default"), ("event", "talk", "elder"),
+                                         ("message", "Quest Updated! Visit the blacksmith.", (0, 255, 0), 2.0)]),
+    ("use", (0, 0, 0), "elder", "done", [("dialogue", "default")]),
+    ("use", (0, 0, 1), "anvil", "default", [("open_shop",)]),
+    ("use", (0, 1, 0), "knight", "default", [("dialogue", "default")]),   # only while caged; once free he steps aside
+    ("use", (0, 1, 0), "cage", "locked", [("start_maze",), ("message", "Solve the maze to free the knight!", (0, 255, 0), 2.0)]),
+    ("use", (0, 1, 0), "cage", "open", [("message", "The knight has already been rescued!", (200, 200, 200), 1.5)]),
+    ("use", (0, 1, 1), "lever", "up", [("event", "solve", "drawbridge"), ("message", "Drawbridge Lowered!", (0, 255, 0), 2.0)]),
+    ("use", (0, 2, 1), "herbcollector", "default", [("dialogue", "default")]),
+    ("use", (0, 2, 1), "safe", "locked", [("open_safe",)]),
+    ("use", (0, 2, 1), "safe", "unlocked", [("message", "The safe is already unlocked.", (200, 200, 200), 1.5)]),
+    ("use", (0, 2, 2), "portal", "charged", [("enter_level_2",)]),
+    ("use", (0, 2, 2), "portal", "uncharged", [("need_keys", PORTAL_KEYS)]),
+    ("give", (0, 2, 1), "herbcollector", "ready", [("take", "Herbs", 3), ("event", "give", "herbcollector"), ("dialogue", "with_herbs"),
+                                                    ("message", "You gave 3 herbs to the collector!", (0, 255, 0), 2.0)]),
+    ("give", (0, 2, 1), "herbcollector", "short", [("message", "You need 3 herbs to give to the collector!", (255, 200, 0), 1.5)]),
+    ("give", (0, 2, 1), "herbcollector", "given", [("message", "You already gave herbs to the collector.", (200, 200, 200), 1.5)]),
+]
+
+
+#  spatial hash of moving entities
+SPATIAL_HASH_CELL = 64   # px; about one goblin wide, so most boxes land in 1-4 cells
+_HASH_ROW = 1 << 16      # packs (cx, cy) into one int64 key
+
+class SpatialHash:
+    """Uniform grid bucketing of moving boxes, rebuilt with NumPy whenever the entities move.
+
+    Entries are kept as parallel arrays sorted by cell key, so a query is a pair of
+    searchsorted calls instead of a scan over every entity.
+    """
+
+    def __init__(self, cell_size=SPATIAL_HASH_CELL):
+        self.cell_size = cell_size
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.ids = np.zeros(0, dtype=np.intp)
+
+    def _cells(self, lows, highs):
+        """Every (box index, cell key) pair for boxes spanning [lows, highs)."""
+        lo = np.floor_divide(lows, self.cell_size).astype(np.int64)
+        hi = np.floor_divide(np.maximum(highs - 1, lows), self.cell_size).astype(np.int64)
+        span = hi - lo + 1
+        counts = span[:, 0] * span[:, 1]
+        owner = np.repeat(np.arange(len(lows)), counts)
+        k = np.arange(owner.size) - np.repeat(np.cumsum(counts) - counts, counts)
+        cx = lo[owner, 0] + k % span[owner, 0]
+        cy = lo[owner, 1] + k // span[owner, 0]
+        return owner, (cx + _HASH_ROW // 2) * _HASH_ROW + (cy + _HASH_ROW // 2)
+
+    def build(self, lows, highs):
+        """Replace the contents with boxes i = [lows[i], highs[i])."""
+        ids, keys = self._cells(lows, highs)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.ids = ids[order]
+
+    def query(self, lows, highs):
+        """Candidate (query index, entity index) pairs whose boxes share a cell.
+
+        A pair can repeat when both boxes span the same several cells; callers doing an
+        exact test afterwards don't mind.
+        """
+        owner, keys = self._cells(lows, highs)
+        start = np.searchsorted(self.keys, keys, "left")
+        counts = np.searchsorted(self.keys, keys, "right") - start
+        rows = np.repeat(owner, counts)
+        k = np.arange(rows.size) - np.repeat(np.cumsum(counts) - counts, counts)
+        return rows, self.ids[np.repeat(start, counts) + k]
+
+goblin_hash = SpatialHash()
+
+class GoblinSwarm:
+    """One room's goblin wave as arrays, stepped together with NumPy. Live goblins fill the first `count` rows,
+    so the arrays themselves are the pool: a new wave refills rows the dead left behind."""
+
+    def __init__(self, capacity=8):
+        self.count = 0
+        self.pos = np.zeros((capacity, 2))    # top-left corners
+        self.prev = np.zeros((capacity, 2))   # positions at the start of the last tick
+        self.alerted = np.zeros(capacity, dtype=np.bool_)   # has seen the player, so keeps chasing
+
+    def __len__(self):
+        return self.count
+
+    def spawn_wave(self, spawn):
+        """Fill the swarm with a new wave, reusing its arrays."""
+        self.remove(range(self.count))
+        n = len(spawn)
+        if n > len(self.pos):
+            self.pos = np.zeros((n, 2))
+            self.prev = np.zeros((n, 2))
+            self.alerted = np.zeros(n, dtype=np.bool_)
+        self.pos[:n] = spawn
+        self.prev[:n] = spawn
+        self.alerted[:n] = False
+        self.count = n
+
+    def remove(self, rows):
+        """Swap-remove dead rows: live goblins from the tail move into the holes."""
+        dead = np.zeros(self.count, dtype=np.bool_)
+        dead[list(rows)] = True
+        k = self.count - int(np.count_nonzero(dead))
+        holes = np.flatnonzero(dead[:k])
+        movers = k + np.flatnonzero(~dead[k:])
+        self.pos[holes] = self.pos[movers]
+        self.prev[holes] = self.prev[movers]
+        self.alerted[holes] = self.alerted[movers]
+        self.count = k
+
+    def spot(self, sight, target, size):
+        """Alert every goblin that can see target from its centre."""
+        w, h = size
+        for row in np.flatnonzero(~self.alerted[:self.count]):
+            x, y = self.pos[row]
+            if sight.can_see((x + w / 2, y + h / 2), target):
+                self.alerted[row] = True
+
+    def separation(self, size, step):
+        """Push apart goblins whose centres are closer than GOBLIN_SEPARATION, up to step px each."""
+        w, h = size
+        centres = self.pos[:self.count] + (w / 2, h / 2)
+        radius = GOBLIN_SEPARATION
+        goblin_hash.build(centres, centres + 1)
+        i, j = goblin_hash.query(centres - radius, centres + radius + 1)
+        keep = i != j
+        i, j = i[keep], j[keep]
+        delta = centres[i] - centres[j]
+        dist = np.hypot(delta[:, 0], delta[:, 1])
+        close = dist < radius
+        i, j, delta, dist = i[close], j[close], delta[close], dist[close]
+
+        # goblins stacked exactly on top of each other split sideways by row order
+        away = np.where(dist[:, None] > 0, delta / np.maximum(dist, 1e-9)[:, None], 0.0)
+        away[dist == 0, 0] = np.sign(i - j)[dist == 0]
+        push = np.zeros_like(centres)
+        np.add.at(push, i, away * ((radius - dist) / radius)[:, None])
+        return push * step
+
+    def step(self, player, step, size, push=None, flow=None):
+        """Move every alerted goblin step px toward the player (along flow, if given), clamp to the room, and return who touches them."""
+        target = player.center
+        w, h = size
+        pos = self.pos[:self.count]
+        centres = pos + (w / 2, h / 2)
+        if flow is not None:
+            target = flow.steer(centres, target)
+        delta = np.subtract(target, centres)
+        dist = np.hypot(delta[:, 0], delta[:, 1])
+        moving = (dist > 1) & self.alerted[:self.count]   # a goblin standing on the player's centre stays put
+        start = pos.copy()
+        pos[moving] += (delta[moving] / dist[moving, None]) * step
+        if push is not None:
+            pos += push
+        pos[:] = np.clip(pos, (0, 0), (ROOM_WIDTH - w, ROOM_HEIGHT - h))
+        if flow is not None:
+            flow.slide(start, pos, size)
+
+        # same overlap test as Rect.colliderect on the truncated goblin rects
+        corner = np.trunc(pos)
+        return (moving & (corner[:, 0] < player.right) & (corner[:, 0] + w > player.left) &
+                (corner[:, 1] < player.bottom) & (corner[:, 1] + h > player.top))
+
+    def store_previous(self):
+        self.prev[:self.count] = self.pos[:self.count]
+
+    def interpolated(self, alpha):
+        """Draw positions blended between the last two ticks."""
+        n = self.count
+        return self.prev[:n] + (self.pos[:n] - self.prev[:n]) * alpha
 
 GOBLIN_WAVES = {
     (0, 0, 2): [
@@ -444,17 +1150,17 @@ GOBLIN_WAVES = {
     ],
 }
 
-def _init_goblin_rooms():
-    """Prepare goblin wave state for configured rooms."""
-    for room_key, waves in GOBLIN_WAVES.items():
-        goblin_rooms[room_key] = {
+def new_goblin_rooms():
+    """Fresh goblin wave state for every configured room."""
+    return {
+        room_key: {
             "waves": waves,
             "wave_index": 0,
-            "active": [],
+            "swarm": GoblinSwarm(),
             "respawn": 0.0,  
         }
-
-_init_goblin_rooms()
+        for room_key, waves in GOBLIN_WAVES.items()
+    }
 
 # room data, this uses a dictionary to define room layouts and contents
 room_data = {
@@ -527,12 +1233,13 @@ room_data = {
             {"type": "cage", "x": 100, "y": 500, "width": 120, "height": 120},
         ],
         "npcs": [
-            {"id": "knight", "x": 130, "y": 530, "name": "Knight Aelric", "rescued": False},
+            {"id": "knight", "x": 130, "y": 530, "name": "Knight Aelric", "rescued_pos": (500, 450)},
         ],
         "items": [
             {"type": "potion", "x": 150, "y": 350, "id": "potion_0_1_0_1"},
  
             {"type": "gold", "x": 600, "y": 400, "id": "gold_0_1_0_1"},
+            {"type": "key", "x": 450, "y": 500, "id": "key_0_1_0_2", "dropped_by": "knight"},
         ]
     },
 
@@ -654,430 +1361,573 @@ room_data = {
                   "items": []},
 }
 
-goblin_states = {}
+#  adjacent room prefetch
+_prefetch_queue = queue.Queue()
+_prefetch_pending = set()
+_prefetch_lock = threading.Lock()
+_prefetch_thread = None
 
-def _init_goblins():
-    """Seed legacy goblin state from room data (initial wave positions)."""
-    forest_key = (0, 0, 2)
-    forest_info = room_data.get(forest_key, {})
-    spawn = []
-    for npc in forest_info.get("npcs", []):
-        if npc.get("id") == "goblin":
-            spawn.append({"x": npc["x"], "y": npc["y"], "alive": True})
-    if spawn:
-        goblin_states[forest_key] = spawn
+def room_asset_requests(level, row, col):
+    """List the (name, width, height) image loads a room makes when drawn."""
+    room_key = (level, row, col)
+    room_info = room_data.get(room_key, {})
+    requests = []
 
-_init_goblins()
+    bg_name = background_asset(level, row, col)
+    if bg_name:
+        requests.append((bg_name, ROOM_WIDTH, ROOM_HEIGHT))
+
+    for obj in room_info.get("objects", []) + room_info.get("interactive", []):
+        if obj["type"] in ["invisible", "damage"]:
+            continue
+        requests.append((f"objects/{obj['type']}.png", obj["width"], obj["height"]))
+
+    npc_types = {npc["id"] for npc in room_info.get("npcs", [])}
+    if room_key in GOBLIN_WAVES:
+        npc_types.add("goblin")
+    for npc_type in npc_types:
+        size = get_npc_size(npc_type)
+        requests.append((f"npcs/{npc_type}.png", size[0], size[1]))
+
+    item_types = {item["type"] for item in room_info.get("items", [])}
+    if room_key == (0, 2, 0):
+        # the boss swings an axe and drops a shard and key when defeated
+        requests.append(("npcs/axe.png", AXE_SIZE[0], AXE_SIZE[1]))
+        item_types.update(["timeshard", "key"])
+    for item_type in item_types:
+        size = get_item_size(item_type)
+        requests.append((f"items/{item_type}.png", size[0], size[1]))
+
+    return requests
+
+def neighbour_rooms(level, row, col):
+    """Return the rooms reachable from this one by walking off an edge."""
+    rooms = []
+    for d_row, d_col in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
+        r, c = row + d_row, col + d_col
+        if 0 <= r < GRID_HEIGHT and 0 <= c < GRID_WIDTH and (level, r, c) in room_data:
+            rooms.append((level, r, c))
+    return rooms
+
+def _prefetch_worker():
+    """Decode queued assets into image_cache off the main thread."""
+    while True:
+        name, width, height = _prefetch_queue.get()
+        cache_key = _image_cache_key(name, width, height)
+        try:
+            if cache_key not in image_cache:
+                start = time.perf_counter()
+                img = _decode_image(name, width, height)
+                if img is not None:
+                    image_cache.put(cache_key, img, (time.perf_counter() - start) * 1000.0)
+        except Exception:
+            pass  # the main thread will retry and fall back to a placeholder
+        finally:
+            with _prefetch_lock:
+                _prefetch_pending.discard(cache_key)
+
+def prefetch_adjacent_rooms(level, row, col):
+    """Warm image_cache for every neighbouring room on a worker thread."""
+    global _prefetch_thread
+    if _prefetch_thread is None:
+        _prefetch_thread = threading.Thread(target=_prefetch_worker, name="asset-prefetch", daemon=True)
+        _prefetch_thread.start()
+
+    for room_key in neighbour_rooms(level, row, col):
+        for name, width, height in room_asset_requests(*room_key):
+            cache_key = _image_cache_key(name, width, height)
+            if cache_key in atlas_sprites or cache_key in image_cache:
+                continue
+            with _prefetch_lock:
+                if cache_key in _prefetch_pending:
+                    continue
+                _prefetch_pending.add(cache_key)
+            _prefetch_queue.put((name, width, height))
+
+def pin_room_assets(level, row, col):
+    """Keep the room the player is standing in resident in image_cache."""
+    image_cache.pin(_image_cache_key(name, width, height) for name, width, height in room_asset_requests(level, row, col))
+
+#  sprite atlas
+ATLAS_PAGE_SIZE = 1024
+ATLAS_PADDING = 1
+SPRITE_DIRS = ["items", "npcs", "objects", "characters"]
+
+def _sprite_size(folder, sprite_type):
+    """Return the draw size for a sprite file, or None if it depends on the room."""
+    if folder == "items":
+        return get_item_size(sprite_type)
+    if folder == "npcs":
+        return AXE_SIZE if sprite_type == "axe" else get_npc_size(sprite_type)
+    if folder == "characters":
+        return (40, 50)
+    return None   # objects are sized per room in room_data
+
+def atlas_sprite_requests():
+    """Collect every (name, width, height) sprite the game can draw."""
+    requests = set()
+    for room_key in room_data:
+        for name, width, height in room_asset_requests(*room_key):
+            if name.split("/")[0] in SPRITE_DIRS:
+                requests.add((name, width, height))
+
+    for folder in SPRITE_DIRS:
+        folder_path = os.path.join(ASSETS_DIR, folder)
+        if not os.path.isdir(folder_path):
+            continue
+        for filename in os.listdir(folder_path):
+            if not filename.endswith(".png"):
+                continue
+            size = _sprite_size(folder, filename[:-4])
+            if size:
+                requests.add((f"{folder}/{filename}", size[0], size[1]))
+    return requests
+
+def build_sprite_atlas():
+    """Shelf-pack all sprites into a few large pages and index them by cache key."""
+    global atlas_pages
+    atlas_pages = []
+    atlas_sprites.clear()
+
+    # tallest first keeps the shelves tight
+    requests = sorted(atlas_sprite_requests(), key=lambda r: (-r[2], -r[1], r[0]))
+    page = None
+    x = y = shelf_height = 0
+    for name, width, height in requests:
+        if width + ATLAS_PADDING > ATLAS_PAGE_SIZE or height + ATLAS_PADDING > ATLAS_PAGE_SIZE:
+            continue  # too big to pack, load_sprite falls back to load_image
+        if page is not None and x + width + ATLAS_PADDING > ATLAS_PAGE_SIZE:
+            x = 0
+            y += shelf_height
+            shelf_height = 0
+        if page is None or y + height + ATLAS_PADDING > ATLAS_PAGE_SIZE:
+            page = pygame.Surface((ATLAS_PAGE_SIZE, ATLAS_PAGE_SIZE), pygame.SRCALPHA).convert_alpha()
+            page.fill((0, 0, 0, 0))
+            atlas_pages.append(page)
+            x = y = shelf_height = 0
+
+        cache_key = _image_cache_key(name, width, height)
+        img = load_image(name, width, height)
+        # RGBA_MAX onto a cleared page copies the pixels exactly, alpha included
+        page.blit(img, (x, y), special_flags=pygame.BLEND_RGBA_MAX)
+        atlas_sprites[cache_key] = page.subsurface((x, y, width, height))
+        image_cache.pop(cache_key)   # the page owns the pixels now
+
+        x += width + ATLAS_PADDING
+        shelf_height = max(shelf_height, height + ATLAS_PADDING)
+
+build_sprite_atlas()
+
+def cooked_asset_requests():
+    """Every asset worth cooking: room backgrounds plus all atlas sprites."""
+    requests = set(atlas_sprite_requests())
+    for room_key in room_data:
+        requests.update(room_asset_requests(*room_key))
+    return requests
 
 #  BOSS FUNCTIONS 
-def init_boss():
+def init_boss(state, kind="goblin_king"):
     """Initialize the boss in the throne room."""
-    global boss, boss_health, boss_max_health, boss_attack_cooldown, boss_axe, boss_axe_angle, boss_defeated, boss_drop_collected, boss_phase, boss_thrown_axes, boss_throw_cooldown
-    boss_rect = pygame.Rect(350, 300, 100, 120)
-    boss = {
-        "rect": boss_rect,
-        "alive": True,
-        "last_direction": "right"
-    }
-    boss_max_health = max_health * 4  
-    boss_health = boss_max_health
-    boss_attack_cooldown = 0
-    boss_axe = {"x": 0, "y": 0, "angle": 0, "swinging": False}
-    boss_axe_angle = 0
-    boss_defeated = False
-    boss_drop_collected = False
-    boss_phase = 1
-    boss_thrown_axes = []
-    boss_throw_cooldown = 0
-
-def update_boss(dt):
-    """Update boss behavior and attacks."""
-    global boss_health, boss_attack_cooldown, boss_axe, boss_axe_angle, boss_axe_swinging, health, boss_defeated, boss_phase, boss_thrown_axes, boss_throw_cooldown
-    
-    if not boss or not boss["alive"]:
+    state.boss = state.boss or Boss()
+    state.boss.reset(kind, state.max_health)
+    state.boss_defeated = False
+    state.boss_drop_collected = False
+    state.projectiles.clear(OWNER_BOSS)
+
+    # the swing mirrors when facing left and thrown axes spin freely
+    axe_img = load_axe_image()
+    prewarm_rotations(axe_img)
+    prewarm_rotations(axe_img, flip_x=True)
+
+# transition conditions, each given the session, this tick's distance to the player and whether the boss can see them
+def boss_sees_player(state, dist, sees):
+    return sees and 0 < dist < state.boss.spec["sight"]
+
+def boss_can_swing(state, dist, sees):
+    return dist < state.boss.spec["swing"]["range"] and state.boss.swing_cooldown <= 0
+
+def boss_can_throw(state, dist, sees):
+    boss = state.boss
+    return (boss.phase_spec["throw_cooldown"] is not None and sees
+            and dist > boss.spec["throw"]["min_range"] and boss.throw_cooldown <= 0)
+
+BOSS_CONDITIONS = {
+    "always": lambda state, dist, sees: True,
+    "sees_player": boss_sees_player,
+    "lost_player": lambda state, dist, sees: not boss_sees_player(state, dist, sees),
+    "can_swing": boss_can_swing,
+    "can_throw": boss_can_throw,
+}
+
+def enter_boss_state(state, name):
+    """Switch the boss to state name, running its entry effect."""
+    boss = state.boss
+    boss.state = name
+    if name == "swing":
+        boss.axe_angle = 0
+        boss.swing_cooldown = boss.phase_spec["swing_cooldown"]
+    elif name == "phase_transition":
+        advance_boss_phase(state)
+
+def advance_boss_phase(state):
+    """Move the boss into its next phase, clamping its health to the phase threshold."""
+    boss = state.boss
+    boss.phase += 1
+    phase = boss.phase_spec
+    boss.health = int(boss.max_health * phase["at"])
+    set_message(state, phase["message"], (255, 100, 100), 3.0)
+
+def boss_swing_tick(state, dt_sec):
+    """Sweep the axe; at the end of the arc it lands, then the boss goes back to chasing."""
+    boss = state.boss
+    swing = boss.spec["swing"]
+    boss.axe_angle += swing["speed"] * dt_sec
+    if boss.axe_angle >= swing["arc"]:
+        boss.axe_angle = 0
+        if state.player.colliderect(calculate_axe_rect(state)):
+            damage = swing["damage"] - (state.armor_level * 5) + boss.phase_spec["swing_bonus"]
+            state.health = max(0, state.health - damage)
+            set_message(state, f"Boss hit you for {damage} damage!", (255, 0, 0), 1.5)
+        enter_boss_state(state, "chase")
+
+def boss_throw_tick(state, dt_sec):
+    throw_axe(state)
+    state.boss.throw_cooldown = state.boss.phase_spec["throw_cooldown"]
+    enter_boss_state(state, "chase")
+
+BOSS_TICKS = {"swing": boss_swing_tick, "throw": boss_throw_tick}
+
+def update_boss(state, dt):
+    """Run one tick of the boss's state machine."""
+    boss = state.boss
+    player = state.player
+    if not boss or not boss.alive:
         return
     
     dt_sec = dt / 1000.0
     
     
-    if boss_attack_cooldown > 0:
-        boss_attack_cooldown -= dt_sec
-    if boss_throw_cooldown > 0:
-        boss_throw_cooldown -= dt_sec
+    if boss.swing_cooldown > 0:
+        boss.swing_cooldown -= dt_sec
+    if boss.throw_cooldown > 0:
+        boss.throw_cooldown -= dt_sec
     
-    # boss movement 
-    speed = 300  
-    dx = player.centerx - boss["rect"].centerx
-    dy = player.centery - boss["rect"].centery
+    dx = player.centerx - boss.rect.centerx
+    dy = player.centery - boss.rect.centery
     dist = math.hypot(dx, dy)
+    sees = state.active_room.sight.can_see(boss.rect.center, player.center)
     
     if dx > 0:
-        boss["last_direction"] = "right"
+        boss.last_direction = "right"
     else:
-        boss["last_direction"] = "left"
+        boss.last_direction = "left"
     
-    if dist > 0 and dist < 400:  
-        step = speed * dt_sec
-        boss["rect"].x += (dx / dist) * step
-        boss["rect"].y += (dy / dist) * step
-        
-        
-        boss["rect"].x = max(100, min(ROOM_WIDTH - boss["rect"].width - 100, boss["rect"].x))
-        boss["rect"].y = max(100, min(ROOM_HEIGHT - boss["rect"].height - 100, boss["rect"].y))
-    
-    # phase 1: Melee attacks
-    if boss_phase == 1:
-        if dist < 180 and boss_attack_cooldown <= 0:
-            boss_axe_swinging = True
-            boss_axe_angle = 0
-            boss_attack_cooldown = 2.5  
-    
-    # phase 2: Melee + Ranged attacks
-    elif boss_phase == 2:
-        if dist < 180 and boss_attack_cooldown <= 0:
-            boss_axe_swinging = True
-            boss_axe_angle = 0
-            boss_attack_cooldown = 2.0  
+    for condition, next_state in BOSS_STATES[boss.state]["transitions"]:
+        if BOSS_CONDITIONS[condition](state, dist, sees):
+            enter_boss_state(state, next_state)
+            break
+    behaviour = BOSS_STATES[boss.state]
+    
+    # boss movement 
+    if behaviour["moves"] and boss_sees_player(state, dist, sees):
+        step = boss.spec["speed"] * dt_sec
+        margin = boss.spec["margin"]
+        boss_x = boss.pos[0] + (dx / dist) * step
+        boss_y = boss.pos[1] + (dy / dist) * step
         
         
-        if dist > 200 and boss_throw_cooldown <= 0:
-            throw_axe()
-            boss_throw_cooldown = 3.0  
-    
-    
-    if boss_axe_swinging:
-        boss_axe_angle += 8  
-        if boss_axe_angle >= 180:
-            boss_axe_swinging = False
-            boss_axe_angle = 0
-            
-           
-            axe_rect = calculate_axe_rect()
-            if player.colliderect(axe_rect):
-                damage = boss_axe_damage - (armor_level * 5)  
-                if boss_phase == 2:
-                    damage += 10  
-                health = max(0, health - damage)
-                set_message(f"Boss hit you for {damage} damage!", (255, 0, 0), 1.5)
+        boss_x = max(margin, min(ROOM_WIDTH - boss.rect.width - margin, boss_x))
+        boss_y = max(margin, min(ROOM_HEIGHT - boss.rect.height - margin, boss_y))
+        boss.pos = [boss_x, boss_y]
+        boss.rect.topleft = (round(boss_x), round(boss_y))
     
+    if behaviour["tick"]:
+        BOSS_TICKS[behaviour["tick"]](state, dt_sec)
 
-    update_thrown_axes(dt_sec)
+    update_thrown_axes(state, dt_sec)
 
-def throw_axe():
-    """Boss throws an axe towards the player in phase 2."""
+def throw_axe(state):
+    """Boss throws an axe towards the player."""
+    boss = state.boss
     if not boss:
         return
     
 
-    dx = player.centerx - boss["rect"].centerx
-    dy = player.centery - boss["rect"].centery
+    dx = state.player.centerx - boss.rect.centerx
+    dy = state.player.centery - boss.rect.centery
     dist = math.hypot(dx, dy)
     
     if dist > 0:
-        speed = 400  
-        boss_thrown_axes.append({
-            "x": float(boss["rect"].centerx),
-            "y": float(boss["rect"].centery),
-            "dx": (dx / dist) * speed,
-            "dy": (dy / dist) * speed,
-            "angle": 0
-        })
-        set_message("Boss throws an axe!", (255, 100, 100), 1.0)
-def enter_level_2():
+        throw = boss.spec["throw"]
+        speed = throw["speed"]
+        state.projectiles.spawn(boss.rect.centerx, boss.rect.centery, (dx / dist) * speed, (dy / dist) * speed,
+                          throw["damage"], OWNER_BOSS, throw["spin"])
+        set_message(state, "Boss throws an axe!", (255, 100, 100), 1.0)
+def enter_level_2(state):
     """Warp player to Level-2 Rooftop Hideout, centre of room."""
-    current_room[0] = 1          # level 2
-    current_room[1] = 0          # row 0  -> Rooftop Hideout
-    current_room[2] = 0          # col 0
-    player.center = (ROOM_WIDTH // 2, ROOM_HEIGHT // 2)
-    set_message("Welcome to Level 2 – The Neon City!", (0, 255, 255), 4.0)
-def update_thrown_axes(dt_sec):
+    state.current_room[0] = 1          # level 2
+    state.current_room[1] = 0          # row 0  -> Rooftop Hideout
+    state.current_room[2] = 0          # col 0
+    state.player.center = (ROOM_WIDTH // 2, ROOM_HEIGHT // 2)
+    snap_interpolation(state)
+    set_message(state, "Welcome to Level 2 – The Neon City!", (0, 255, 255), 4.0)
+def update_thrown_axes(state, dt_sec):
     """Update positions of thrown axes and check for collisions."""
-    global boss_thrown_axes, health
+    projectiles = state.projectiles
     
-    axes_to_remove = []
+    axes = projectiles.owned_by(OWNER_BOSS)
+    projectiles.advance(axes, dt_sec)
+    axes = projectiles.cull(axes, 50)
     
-    for i, axe in enumerate(boss_thrown_axes):
-       
-        axe["x"] += axe["dx"] * dt_sec
-        axe["y"] += axe["dy"] * dt_sec
-        axe["angle"] += 10  
-        
-        
-        if (axe["x"] < -50 or axe["x"] > ROOM_WIDTH + 50 or 
-            axe["y"] < -50 or axe["y"] > ROOM_HEIGHT + 50):
-            axes_to_remove.append(i)
-            continue
-        
-        
-        axe_rect = pygame.Rect(axe["x"] - 20, axe["y"] - 10, 40, 20)
-        if player.colliderect(axe_rect):
-            damage = 40 - (armor_level * 3)  
-            health = max(0, health - damage)
-            set_message(f"Thrown axe hit for {damage} damage!", (255, 0, 0), 1.5)
-            axes_to_remove.append(i)
+    for index in axes[projectiles.hits_rect(axes, 20, 10, state.player)]:
+        damage = int(projectiles.damage[index]) - (state.armor_level * 3)  
+        state.health = max(0, state.health - damage)
+        set_message(state, f"Thrown axe hit for {damage} damage!", (255, 0, 0), 1.5)
+        projectiles.alive[index] = False
     
-   
-    for i in sorted(axes_to_remove, reverse=True):
-        boss_thrown_axes.pop(i)
+    projectiles.compact()
 
-def calculate_axe_rect():
+def calculate_axe_rect(state, angle=None):
     """Calculate the current position of the boss's axe."""
+    boss = state.boss
     if not boss:
         return pygame.Rect(0, 0, 0, 0)
     
-    center_x = boss["rect"].centerx
-    center_y = boss["rect"].centery
-    
-    radius = 90  
-    angle_rad = math.radians(boss_axe_angle)
-    
-    if boss["last_direction"] == "right":
-        axe_x = center_x + radius * math.cos(angle_rad)
-        axe_y = center_y + radius * math.sin(angle_rad)
-    else:
-        axe_x = center_x - radius * math.cos(angle_rad)
-        axe_y = center_y + radius * math.sin(angle_rad)
-    
-    return pygame.Rect(axe_x - 40, axe_y - 20, 80, 40)
+    angle = boss.axe_angle if angle is None else angle
+    return boss.hitboxes[boss.last_direction][round(angle)].move(boss.rect.center)
 
-def draw_boss(surface):
+def draw_boss(state, surface):
     """Draw the boss and his axe."""
-    if not boss or not boss["alive"]:
+    boss = state.boss
+    if not boss or not boss.alive:
         return
     
-    img = load_npc_image("boss1")
-    surface.blit(img, (boss["rect"].x, boss["rect"].y))
+    # draw between the last two ticks so motion stays smooth at any frame rate
+    boss_x = round(lerp(boss.prev[0], boss.pos[0], state.render_alpha))
+    boss_y = round(lerp(boss.prev[1], boss.pos[1], state.render_alpha))
+    img = load_npc_image(boss.spec["sprite"])
+    mark_dirty(surface.blit(img, (boss_x, boss_y)))
     
-    if boss_axe_swinging:
-        axe_rect = calculate_axe_rect()
+    if boss.swinging:
+        angle = lerp(boss.axe_prev_angle, boss.axe_angle, state.render_alpha) if boss.axe_prev_angle <= boss.axe_angle else boss.axe_angle
+        axe_rect = calculate_axe_rect(state, angle).move(boss_x - boss.rect.x, boss_y - boss.rect.y)
         axe_img = load_axe_image()
-        
-        rotated_axe = pygame.transform.rotate(axe_img, -boss_axe_angle)
-        if boss["last_direction"] == "left":
-            rotated_axe = pygame.transform.flip(rotated_axe, True, False)
-        
-        surface.blit(rotated_axe, (axe_rect.x, axe_rect.y))
+        rotated_axe = rotated_sprite(axe_img, -angle, boss.last_direction == "left")
+        mark_dirty(surface.blit(rotated_axe, (axe_rect.x, axe_rect.y)))
     
     
-    for axe in boss_thrown_axes:
-        axe_img = load_axe_image()
-        rotated_axe = pygame.transform.rotate(axe_img, -axe["angle"])
-        surface.blit(rotated_axe, (axe["x"] - 40, axe["y"] - 20))
+    axe_img = load_axe_image()
+    positions, angles = state.projectiles.interpolated(OWNER_BOSS, state.render_alpha)
+    for (x, y), angle in zip(positions, angles):
+        rotated_axe = rotated_sprite(axe_img, -angle)
+        mark_dirty(surface.blit(rotated_axe, (x - 40, y - 20)))
     
     
     health_width = 300
     health_x = ROOM_WIDTH // 2 - health_width // 2
     health_y = 20
     
-    pygame.draw.rect(surface, (100, 0, 0), (health_x, health_y, health_width, 25))
-    pygame.draw.rect(surface, (255, 0, 0), (health_x, health_y, health_width * (boss_health / boss_max_health), 25))
+    mark_dirty(pygame.draw.rect(surface, (100, 0, 0), (health_x, health_y, health_width, 25)))
+    pygame.draw.rect(surface, (255, 0, 0), (health_x, health_y, health_width * (boss.health / boss.max_health), 25))
     pygame.draw.rect(surface, (255, 255, 255), (health_x, health_y, health_width, 25), 2)
     
-    phase_text = f"Goblin King (Phase {boss_phase}): {int(boss_health)}/{boss_max_health}"
-    health_text = font.render(phase_text, True, (255, 255, 255))
-    surface.blit(health_text, (health_x + 5, health_y + 3))
+    phase_text = f"{boss.spec['name']} (Phase {boss.phase}): {int(boss.health)}/{boss.max_health}"
+    health_text = render_text(font, phase_text, (255, 255, 255))
+    mark_dirty(surface.blit(health_text, (health_x + 5, health_y + 3)))
 
-def check_boss_hit():
+def check_boss_hit(state, shots):
     """Check if bullets hit the boss."""
-    global boss_health, bullets, boss_defeated, boss_phase
+    boss = state.boss
+    projectiles = state.projectiles
     
-    if not boss or not boss["alive"]:
+    if not boss or not boss.alive:
         return
     
-    bullets_to_remove = []
-    for i, bullet in enumerate(bullets):
-        bullet_rect = pygame.Rect(bullet["x"] - 2, bullet["y"] - 2, 4, 4)
-        if boss["rect"].colliderect(bullet_rect):
-            boss_health -= bullet["damage"]
-            bullets_to_remove.append(i)
-            
-            
-            if boss_phase == 1 and boss_health <= boss_max_health // 2:
-                boss_phase = 2
-                boss_health = boss_max_health // 2  
-                set_message("The Goblin King enters Phase 2! He's faster and throws axes!", (255, 100, 100), 3.0)
-            
-            if boss_health <= 0:
-                boss["alive"] = False
-                boss_defeated = True
-                set_message("Goblin King defeated! Collect the drops!", (0, 255, 0), 3.0)
-    
-    
-    for i in sorted(bullets_to_remove, reverse=True):
-        bullets.pop(i)
+    phases = boss.spec["phases"]
+    for index in shots[projectiles.hits_rect(shots, 2, 2, boss.rect)]:
+        boss.health -= int(projectiles.damage[index])
+        projectiles.alive[index] = False
+        
+        
+        if boss.phase < len(phases) and boss.health <= boss.max_health * phases[boss.phase]["at"]:
+            if BOSS_STATES[boss.state]["tick"]:
+                advance_boss_phase(state)   # a swing or throw already under way still lands
+            else:
+                enter_boss_state(state, "phase_transition")
+        
+        if boss.health <= 0:
+            boss.alive = False
+            projectiles.alive[projectiles.owned_by(OWNER_BOSS)] = False   # nothing advances axes once the boss is gone
+            state.boss_defeated = True
+            publish(state, "kill", boss.kind)
+            set_message(state, f"{boss.spec['name']} defeated! Collect the drops!", (0, 255, 0), 3.0)
 
-def draw_boss_drops(surface):
+def draw_boss_drops(state, surface):
     """Draw the boss drops after defeat."""
-    if boss_defeated and not boss_drop_collected:
+    boss = state.boss
+    if state.boss_defeated and not state.boss_drop_collected:
        
         timeshard_img = load_item_image("timeshard")
-        surface.blit(timeshard_img, (boss["rect"].centerx - 25, boss["rect"].centery - 25))
+        mark_dirty(surface.blit(timeshard_img, (boss.rect.centerx - 25, boss.rect.centery - 25)))
         
        
         key_img = load_item_image("key")
-        surface.blit(key_img, (boss["rect"].centerx + 15, boss["rect"].centery - 25))
+        mark_dirty(surface.blit(key_img, (boss.rect.centerx + 15, boss.rect.centery - 25)))
 
-def collect_boss_drops():
+def collect_boss_drops(state):
     """Collect boss drops when player walks over them."""
-    global boss_drop_collected, inventory, quests
-    
-    if boss_defeated and not boss_drop_collected:
-        drop_rect = pygame.Rect(boss["rect"].centerx - 40, boss["rect"].centery - 40, 80, 80)
-        if player.colliderect(drop_rect):
-            inventory["Time Shards"] += 1
-            inventory["Keys"] += 1
-            boss_drop_collected = True
-            quests["defeat_goblin_king"]["complete"] = True
-            quests["find_shard_1"]["complete"] = True
-            set_message("Collected Time Shard and Key from Goblin King!", (0, 255, 0), 3.0)
+    
+    if state.boss_defeated and not state.boss_drop_collected:
+        drop_rect = pygame.Rect(state.boss.rect.centerx - 40, state.boss.rect.centery - 40, 80, 80)
+        if state.player.colliderect(drop_rect):
+            state.inventory["Time Shards"] += 1
+            state.inventory["Keys"] += 1
+            state.boss_drop_collected = True
+            publish(state, "pickup", "goblin_king_drop")
+            set_message(state, "Collected Time Shard and Key from Goblin King!", (0, 255, 0), 3.0)
 
 #  weapon and shooting system
-def shoot_bullet():
-    """Shoot a bullet towards the mouse position."""
-    global ammo, shoot_cooldown, is_reloading
+def shoot_bullet(state, aim):
+    """Shoot a bullet towards the aim point (the mouse position)."""
+    player = state.player
     
-    if not has_weapon:
-        set_message("You need a weapon! Visit the blacksmith.", (255, 200, 0), 2.0)
+    if not state.has_weapon:
+        set_message(state, "You need a weapon! Visit the blacksmith.", (255, 200, 0), 2.0)
         return False
         
-    if not is_reloading and ammo > 0 and shoot_cooldown <= 0:
-        dx = mouse_x - player.centerx
-        dy = mouse_y - player.centery
+    if not state.is_reloading and state.ammo > 0 and state.shoot_cooldown <= 0:
+        dx = aim[0] - player.centerx
+        dy = aim[1] - player.centery
         dist = math.sqrt(dx*dx + dy*dy)
         
         if dist > 0:
-            bullet_speed = 15.0
-            damage = 20 + (weapon_level * 5)  
+            bullet_speed = BULLET_SPEED
+            damage = 20 + (state.weapon_level * 5)  
             
-            bullets.append({
-                "x": float(player.centerx),
-                "y": float(player.centery),
-                "dx": (dx / dist) * bullet_speed,
-                "dy": (dy / dist) * bullet_speed,
-                "damage": damage
-            })
+            state.projectiles.spawn(player.centerx, player.centery, (dx / dist) * bullet_speed, (dy / dist) * bullet_speed,
+                              damage, OWNER_PLAYER)
             
-            ammo -= 1
-            shoot_cooldown = 0.2
+            state.ammo -= 1
+            state.shoot_cooldown = 0.2
                 
             return True
     
     
-    if ammo == 0 and has_weapon and not is_reloading:
-        set_message("Out of ammo! Buy more from the blacksmith.", (255, 200, 0), 1.5)
+    if state.ammo == 0 and state.has_weapon and not state.is_reloading:
+        set_message(state, "Out of ammo! Buy more from the blacksmith.", (255, 200, 0), 1.5)
     
     return False
 
-def update_bullets(dt):
+def update_bullets(state, dt):
     """Update bullet positions and check collisions."""
-    global bullets
-    
-    bullets_to_remove = []
-    for i, bullet in enumerate(bullets):
-        bullet["x"] += bullet["dx"] * (dt / 16.0)
-        bullet["y"] += bullet["dy"] * (dt / 16.0)
-        
-       
-        if (bullet["x"] < 0 or bullet["x"] > ROOM_WIDTH or 
-            bullet["y"] < 0 or bullet["y"] > ROOM_HEIGHT):
-            bullets_to_remove.append(i)
-            continue
+    projectiles = state.projectiles
+    shots = projectiles.owned_by(OWNER_PLAYER)
+    projectiles.advance(shots, dt / 1000.0)
+    shots = projectiles.cull(shots, 0)
 
-       
-        room_key = tuple(current_room)
-        state = goblin_rooms.get(room_key)
-        if state:
-            w, h = get_npc_size("goblin")
-            for goblin in state["active"]:
-                if not goblin.get("alive", True):
-                    continue
-                goblin_rect = pygame.Rect(goblin["x"], goblin["y"], w, h)
-                if goblin_rect.collidepoint(bullet["x"], bullet["y"]):
-                    goblin["alive"] = False
-                    if not goblin.get("loot_given"):
-                        
-                        inventory["Gold"] += 10
-                        goblin["loot_given"] = True
-                        message_text = "+10 Gold (Goblin)"
-                        set_message(message_text, (255, 215, 0), 1.5)
-                    bullets_to_remove.append(i)
-                    break
+    goblins = state.goblin_rooms.get(state.active_room.key)
+    if goblins and len(shots):
+        hit_goblins(state, shots, goblins)
     
    
-    if tuple(current_room) == (0, 2, 0) and boss and boss["alive"]:
-        check_boss_hit()
+    if state.active_room.key == (0, 2, 0) and state.boss and state.boss.alive:
+        check_boss_hit(state, shots)
     
 
-    for i in sorted(bullets_to_remove, reverse=True):
-        bullets.pop(i)
+    projectiles.compact()
 
-def draw_bullets(surface):
+def hit_goblins(state, shots, goblins):
+    """Kill the first live goblin each bullet lands in, testing only pairs that share a hash cell."""
+    swarm = goblins["swarm"]
+    if not swarm.count:
+        return
+    w, h = get_npc_size("goblin")
+    corners = np.floor(swarm.pos[:swarm.count])
+    points = np.floor(state.projectiles.pos[shots])
+    goblin_hash.build(corners, corners + (w, h))
+    rows, cols = goblin_hash.query(points, points + 1)
+    inside = ((points[rows] >= corners[cols]) & (points[rows] < corners[cols] + (w, h))).all(axis=1)
+    rows, cols = rows[inside], cols[inside]
+    order = np.lexsort((cols, rows))
+
+    # a goblin can only die once, so the few overlapping pairs resolve in shot order
+    killed = []
+    spent = set()
+    for row, col in zip(rows[order].tolist(), cols[order].tolist()):
+        if row not in spent and col not in killed:
+            spent.add(row)
+            killed.append(col)
+            state.inventory["Gold"] += 10
+            set_message(state, "+10 Gold (Goblin)", (255, 215, 0), 1.5)
+            state.projectiles.alive[shots[row]] = False
+    if killed:
+        swarm.remove(killed)
+
+def draw_bullets(state, surface):
     """Draw all active bullets."""
-    for bullet in bullets:
-        pygame.draw.circle(surface, (255, 255, 0), (int(bullet["x"]), int(bullet["y"])), 4)
-        pygame.draw.circle(surface, (255, 200, 0), (int(bullet["x"]), int(bullet["y"])), 2)
+    positions, _ = state.projectiles.interpolated(OWNER_PLAYER, state.render_alpha)
+    for x, y in positions:
+        mark_dirty(pygame.draw.circle(surface, (255, 255, 0), (int(x), int(y)), 4))
+        pygame.draw.circle(surface, (255, 200, 0), (int(x), int(y)), 2)
 
-def draw_weapon_hud(surface):
+def draw_weapon_hud(state, surface):
     """Draw weapon ammo and reload status."""
-    if has_weapon:
-        ammo_text = font.render(f"Ammo: {ammo}/{max_ammo}", True, (255, 255, 255))
-        surface.blit(ammo_text, (10, 10))
+    if state.has_weapon:
+        ammo_text = render_text(font, f"Ammo: {state.ammo}/{max_ammo}", (255, 255, 255))
+        mark_dirty(surface.blit(ammo_text, (10, 10)))
         
-        if is_reloading:
-            reload_text = font.render("RELOADING...", True, (255, 0, 0))
-            surface.blit(reload_text, (10, 40))
-        elif ammo == 0:
-            reload_hint = font.render("Buy ammo from Blacksmith", True, (255, 200, 0))
-            surface.blit(reload_hint, (10, 40))
+        if state.is_reloading:
+            reload_text = render_text(font, "RELOADING...", (255, 0, 0))
+            mark_dirty(surface.blit(reload_text, (10, 40)))
+        elif state.ammo == 0:
+            reload_hint = render_text(font, "Buy ammo from Blacksmith", (255, 200, 0))
+            mark_dirty(surface.blit(reload_hint, (10, 40)))
         
        
-        weapon_text = small_font.render(f"Weapon Lvl: {weapon_level}", True, (200, 200, 255))
-        armor_text = small_font.render(f"Armor Lvl: {armor_level}", True, (200, 255, 200))
-        surface.blit(weapon_text, (10, ROOM_HEIGHT - 80))
-        surface.blit(armor_text, (10, ROOM_HEIGHT - 60))
+        weapon_text = render_text(small_font, f"Weapon Lvl: {state.weapon_level}", (200, 200, 255))
+        armor_text = render_text(small_font, f"Armor Lvl: {state.armor_level}", (200, 255, 200))
+        mark_dirty(surface.blit(weapon_text, (10, ROOM_HEIGHT - 80)))
+        mark_dirty(surface.blit(armor_text, (10, ROOM_HEIGHT - 60)))
     else:
         
-        no_weapon_text = font.render("No Weapon - Visit Blacksmith", True, (255, 100, 100))
-        surface.blit(no_weapon_text, (10, 10))
-        hint_text = small_font.render("", True, (200, 200, 200))
-        surface.blit(hint_text, (10, 40))
+        no_weapon_text = render_text(font, "No Weapon - Visit Blacksmith", (255, 100, 100))
+        mark_dirty(surface.blit(no_weapon_text, (10, 10)))
+        hint_text = render_text(small_font, "", (200, 200, 200))
+        mark_dirty(surface.blit(hint_text, (10, 40)))
         
         
-        if armor_level > 0:
-            armor_text = small_font.render(f"Armor Lvl: {armor_level}", True, (200, 255, 200))
-            surface.blit(armor_text, (10, ROOM_HEIGHT - 60))
+        if state.armor_level > 0:
+            armor_text = render_text(small_font, f"Armor Lvl: {state.armor_level}", (200, 255, 200))
+            mark_dirty(surface.blit(armor_text, (10, ROOM_HEIGHT - 60)))
 
 #  PLAYER DEATH AND RESPAWN 
-def respawn_player():
+def respawn_player(state):
     """Handle player respawn with penalties."""
-    global health, max_health, weapon_level, armor_level, player, current_room, ammo, is_reloading, reload_time
     
    
-    if weapon_level > 1:
-        weapon_level -= 1
-    if armor_level > 0:
-        armor_level -= 1
-        max_health = 100 + (armor_level * 20)  
+    if state.weapon_level > 1:
+        state.weapon_level -= 1
+    if state.armor_level > 0:
+        state.armor_level -= 1
+        state.max_health = 100 + (state.armor_level * 20)  
     
     
-    health = max_health
-    player.x = 100
-    player.y = ROOM_HEIGHT - 150
-    current_room = [0, 0, 0]  
-    ammo = 0 if not has_weapon else max_ammo
-    is_reloading = False
-    reload_time = 0.0
+    state.health = state.max_health
+    state.player.x = 100
+    state.player.y = ROOM_HEIGHT - 150
+    state.current_room = [0, 0, 0]  
+    state.ammo = 0 if not state.has_weapon else max_ammo
+    state.is_reloading = False
+    state.reload_time = 0.0
+    snap_interpolation(state)
     
-    set_message("You died! Respawned in village. Lost 1 weapon and armor level.", (255, 100, 100), 4.0)
+    set_message(state, "You died! Respawned in village. Lost 1 weapon and armor level.", (255, 100, 100), 4.0)
 
 #  drawing zones 
 def draw_object(x, y, obj_type, surface, level, width=None, height=None):
     """Draw objects using images only."""
     # For invisible barriers
     if obj_type == "invisible":
-        rect = pygame.Rect(x, y, width, height)
-        colliders.append(rect)
-        
         # Draw invisible barriers in development mode only
         if DEV_MODE:
            
@@ -1088,74 +1938,58 @@ def draw_object(x, y, obj_type, surface, level, width=None, height=None):
            
             pygame.draw.rect(surface, (255, 0, 0), (x, y, width, height), 2)
        
-            label_font = pygame.font.SysFont(None, 20)
-            label = label_font.render("INVISIBLE", True, (255, 255, 255))
+            label_font = get_font(20)
+            label = render_text(label_font, "INVISIBLE", (255, 255, 255))
             surface.blit(label, (x + 5, y + 5))
-        
-        return rect
+        return
     
     
     if obj_type == "damage":
-        rect = pygame.Rect(x, y, width, height)
-        damage_zones.append(rect)
-        
-        
         if DEV_MODE:
             debug_surface = pygame.Surface((width, height), pygame.SRCALPHA)
             debug_surface.fill((255, 100, 0, 60))  
             surface.blit(debug_surface, (x, y))
             pygame.draw.rect(surface, (255, 100, 0), (x, y, width, height), 2)
            
-            label_font = pygame.font.SysFont(None, 20)
-            label = label_font.render("DAMAGE", True, (255, 255, 255))
+            label_font = get_font(20)
+            label = render_text(label_font, "DAMAGE", (255, 255, 255))
             surface.blit(label, (x + 5, y + 5))
-        
-        return rect
+        return
         
 
     img = load_object_image(obj_type, width, height)
     surface.blit(img, (x, y))
-    
-  
-    rect = pygame.Rect(x, y, width, height)
-    
 
-    if obj_type in ["tree", "rock", "building", "bridge_wall", "bridge"]:
-        colliders.append(rect)
-    
-    if obj_type in ["anvil", "campfire", "cage", "lever", "portal", "bookshelf", "rune", "safe"]:
-        interactive_objects.append({"rect": rect, "type": obj_type, "x": x, "y": y})
-        if obj_type != "portal":  
-            colliders.append(rect)
-    
-    return rect
-
-def handle_damage_zones(dt):
+def handle_damage_zones(state, dt):
     """Check if player is in damage zones and apply damage."""
-    global health, damage_timer, message, message_timer, message_color
     
-    damage_timer += dt / 1000.0  
+    state.damage_timer += dt / 1000.0  
 
 
     player_in_damage_zone = False
-    for zone in damage_zones:
-        if player.colliderect(zone):
+    for zone in state.active_room.damage_zones:
+        if state.player.colliderect(zone):
             player_in_damage_zone = True
             break
     
     if player_in_damage_zone:
 
-        if damage_timer >= 1.0:
-            damage_timer = 0.0
-            health -= 5  
+        if state.damage_timer >= 1.0:
+            state.damage_timer = 0.0
+            state.health -= 5  
             
-            set_message("-5 Health!", (255, 0, 0), 1.0)
+            set_message(state, "-5 Health!", (255, 0, 0), 1.0)
             
-            if health <= 0:
-                health = 0
-                respawn_player()
-        
- 
+            if state.health <= 0:
+                state.health = 0
+                respawn_player(state)
+    else:
+  
+        state.damage_timer = 0.0
+
+def draw_damage_border(state, surface):
+    """Pulse a red border while the player stands in a damage zone."""
+    if any(state.player.colliderect(zone) for zone in state.active_room.damage_zones):
         pulse = (math.sin(pygame.time.get_ticks() * 0.01) + 1) * 0.5  
         border_alpha = int(80 + pulse * 80)  
         border_width = int(5 + pulse * 10)  
@@ -1172,16 +2006,13 @@ def handle_damage_zones(dt):
      
         pygame.draw.rect(border_surface, (255, 0, 0, border_alpha), (ROOM_WIDTH - border_width, 0, border_width, ROOM_HEIGHT))
         
-        screen.blit(border_surface, (0, 0))
-        
-    else:
-  
-        damage_timer = 0.0
+        surface.blit(border_surface, (0, 0))
+        invalidate_screen()
 
-def draw_player(surface, player_rect):
+def draw_player(state, surface, player_rect):
     """Draw player using directional sprite."""
-    img = load_player_image(player_direction)  
-    surface.blit(img, (player_rect.x, player_rect.y))
+    img = load_player_image(state.player_direction)  
+    mark_dirty(surface.blit(img, (player_rect.x, player_rect.y)))
 
 def draw_player_pointer(surface, player_rect):
     """Draw a small pointer anchored to the player's left side."""
@@ -1192,143 +2023,544 @@ def draw_player_pointer(surface, player_rect):
         (tip_x, center_y),
         (tip_x + POINTER_SIZE, center_y + POINTER_SIZE // 2),
     ]
-    pygame.draw.polygon(surface, POINTER_COLOR, points)
+    mark_dirty(pygame.draw.polygon(surface, POINTER_COLOR, points))
 
 def draw_npc(surface, x, y, npc_id, rescued=False):
     """Draw NPCs using images."""
     img = load_npc_image(npc_id)
     surface.blit(img, (x, y))
-    size = get_npc_size(npc_id)
-    rect = pygame.Rect(x, y, size[0], size[1])
-    
-   
-    if not rescued:
-        colliders.append(rect)
-        npcs.append(rect)
-    return rect
 
-def draw_goblins(surface, room_key):
+def draw_goblins(state, surface, room_key):
     """Draw goblin enemies for the current room."""
-    state = goblin_rooms.get(room_key)
-    if not state:
+    goblins = state.goblin_rooms.get(room_key)
+    if not goblins:
         return
-    w, h = get_npc_size("goblin")
-    for goblin in state["active"]:
-        if not goblin.get("alive", True):
-            continue
-        img = load_npc_image("goblin")
-        surface.blit(img, (goblin["x"], goblin["y"]))
+    img = load_npc_image("goblin")
+    for x, y in goblins["swarm"].interpolated(state.render_alpha):
+        mark_dirty(surface.blit(img, (x, y)))
         # Goblins handle their own collision/damage; keep them out of the collider list
         # so they do not push the player back like walls.
 
-def draw_item(surface, x, y, item_type, item_id):
+def draw_item(surface, item):
     """Draw items using images."""
-    
-    level, row, col = current_room
-    collected_set = get_collected_set(item_type)
-    if (level, row, col, x, y) in collected_set:
-        return None
-    
-    img = load_item_image(item_type)
-    surface.blit(img, (x, y))
-    
-    
-    if item_type in ["key", "gold", "herb"]:
-        rect = pygame.Rect(x, y, 45, 45)  
-    elif item_type == "timeshard":
-        rect = pygame.Rect(x, y, 50, 50)  
-    else:
-        rect = pygame.Rect(x, y, 25, 25)
-    
-
-    if item_type == "gold":
-        gold_items.append((rect, x, y))
-    elif item_type == "herb":
-        herbs.append((rect, x, y))
-    elif item_type == "potion":
-        potions.append((rect, x, y))
-    elif item_type == "timeshard":
-
-        pass
-    elif item_type == "key":
-
-        pass
-    
+    img = load_item_image(item.type)
+    return mark_dirty(surface.blit(img, (item.x, item.y)))
+
+#  dirty rectangle rendering
+DIRTY_RECT_RENDERING = True   # False repaints and flips the whole screen every frame, for comparison
+dirty_rects = []              # screen regions drawn over the static layer this frame
+_previous_dirty_rects = []    # last frame's regions, restored from the layer before redrawing
+_rendered_layer = None        # static layer currently painted on screen
+_flip_this_frame = True       # something untracked was drawn, push the whole screen
+_repaint_next_frame = False   # ...and repaint everything from the layer next frame
+_screen_stale = True          # the next restore has to repaint the whole layer
+
+def mark_dirty(rect):
+    """Record a region drawn this frame so it gets pushed now and erased next frame."""
+    if rect:
+        dirty_rects.append(rect)
     return rect
 
-def get_collected_set(item_type):
-    if item_type == "gold":
-        return collected_gold
-    elif item_type == "herb":
-        return collected_herbs
-    elif item_type == "potion":
-        return collected_potions
-    elif item_type == "key":
-        return collected_keys
-    elif item_type == "timeshard":
-        return collected_timeshards
-    return set()
-
-def draw_room(surface, level, row, col):
-    """Draw the current room using images only."""
-    global colliders, gold_items, herbs, potions, npcs, interactive_objects, damage_zones
-
-    # clearing dynamic lists each frame keeps objects synced to the current room state
-    colliders = []
-    gold_items = []
-    herbs = []
-    potions = []
-    npcs = []
-    interactive_objects = []
-    damage_zones = []
+def invalidate_screen():
+    """Note full-screen drawing the dirty rects cannot track (overlays, menus, effects)."""
+    global _flip_this_frame, _repaint_next_frame
+    _flip_this_frame = True
+    _repaint_next_frame = True
+
+def restore_static_layer(surface, layer):
+    """Paint the static room layer, in full or only under last frame's dirty rects."""
+    global _rendered_layer, _flip_this_frame, _screen_stale
+    if not DIRTY_RECT_RENDERING or _screen_stale or layer is not _rendered_layer:
+        surface.blit(layer, (0, 0))
+        _flip_this_frame = True
+        _screen_stale = False
+    else:
+        for rect in _previous_dirty_rects:
+            surface.blit(layer, rect, rect)
+    _rendered_layer = layer
+
+def present_frame():
+    """Push the frame to the display, only the changed rects when nothing untracked was drawn."""
+    global dirty_rects, _previous_dirty_rects, _flip_this_frame, _repaint_next_frame, _screen_stale
+    if not DIRTY_RECT_RENDERING or _flip_this_frame:
+        pygame.display.flip()
+    else:
+        pygame.display.update(_previous_dirty_rects + dirty_rects)
+    _previous_dirty_rects = dirty_rects
+    dirty_rects = []
+    _screen_stale = _repaint_next_frame
+    _flip_this_frame = False
+    _repaint_next_frame = False
+
+#  static room layers
+STATIC_LAYER_CACHE_SIZE = 5   # the current room plus its neighbours
+static_layers = OrderedDict()   # room variant -> pre-composited background and props
+
+def _friendly_npcs(room_info, knight_rescued):
+    """Yield (npc, rescued) for NPCs drawn as part of the room rather than as enemies."""
+    for npc in room_info.get("npcs", []):
+        if npc.get("id") in ["goblin", "boss1"]:
+            continue  
+        
+        # a freed knight stands clear of his cage, so draw him there in his rescued pose
+        rescued = False
+        if npc.get("id") == "knight" and knight_rescued:
+            rescued = True
+            x, y = npc["rescued_pos"]
+            npc = dict(npc, x=x, y=y)
+        yield npc, rescued
 
-    room_key = (level, row, col)
-    room_info = room_data.get(room_key, {})
+def build_static_layer(room):
+    """Composite the background, props and friendly NPCs of a room into one surface."""
+    level, row, col = room.key
+    layer = pygame.Surface((ROOM_WIDTH, ROOM_HEIGHT)).convert()
 
     # draw background first so everything else sits on top
     bg_img = load_smart_bg(level, row, col)
     if bg_img:
-        surface.blit(bg_img, (0, 0))
+        layer.blit(bg_img, (0, 0))
     else:
         # simple fallback background if an image is missing
-        surface.fill((80, 120, 80))
+        layer.fill((80, 120, 80))
+
+    # place static objects like rocks and portal frame, then interactive props
+    for obj in room.objects:
+        draw_object(obj["x"], obj["y"], obj["type"], layer, level, obj["width"], obj["height"])
+
+    for npc, rescued in room.friendly_npcs:
+        draw_npc(layer, npc["x"], npc["y"], npc["id"], rescued)
+    return layer
+
+def get_static_layer(room):
+    """Return the cached static layer for a compiled room, compositing it on first use."""
+    layer = static_layers.get(room.variant)
+    if layer is None:
+        layer = build_static_layer(room)
+        static_layers[room.variant] = layer
+        if len(static_layers) > STATIC_LAYER_CACHE_SIZE:
+            static_layers.popitem(last=False)
+    else:
+        static_layers.move_to_end(room.variant)
+    return layer
+
+def invalidate_static_layer(room_key):
+    """Drop every cached static layer of a room after its props or NPCs change."""
+    for variant in [variant for variant in static_layers if variant[0] == tuple(room_key)]:
+        del static_layers[variant]
+
+#  static collision index
+COLLISION_CELL_SIZE = 100   # 8x8 cells over an 800x800 room
+
+def merge_colliders(rects):
+    """Drop rects covered by another and fuse pairs whose union is itself a rect."""
+    merged = []
+    for rect in rects:
+        if rect.w > 0 and rect.h > 0 and rect not in merged:
+            merged.append(pygame.Rect(rect))
+    changed = True
+    while changed:
+        changed = False
+        for i, a in enumerate(merged):
+            for j, b in enumerate(merged):
+                if i == j:
+                    continue
+                same_columns = a.x == b.x and a.w == b.w and a.top <= b.bottom and b.top <= a.bottom
+                same_rows = a.y == b.y and a.h == b.h and a.left <= b.right and b.left <= a.right
+                if a.contains(b) or same_columns or same_rows:
+                    merged[i] = a.union(b)
+                    del merged[j]
+                    changed = True
+                    break
+            if changed:
+                break
+    return merged
+
+class CollisionGrid:
+    """Uniform grid over a room's static colliders, queried with swept player bounds."""
+
+    def __init__(self, rects, cell_size=COLLISION_CELL_SIZE):
+        self.cell_size = cell_size
+        self.rects = merge_colliders(rects)
+        self.cells = {}   # (cx, cy) -> indices into self.rects, in authoring order
+        for index, rect in enumerate(self.rects):
+            for cell in self._cells_for(rect):
+                self.cells.setdefault(cell, []).append(index)
+
+    def _cells_for(self, rect):
+        size = self.cell_size
+        for cx in range(rect.left // size, (rect.right - 1) // size + 1):
+            for cy in range(rect.top // size, (rect.bottom - 1) // size + 1):
+                yield cx, cy
+
+    def query(self, bounds):
+        """Return the colliders that overlap bounds, in authoring order."""
+        found = set()
+        for cell in self._cells_for(bounds):
+            found.update(self.cells.get(cell, ()))
+        return [self.rects[index] for index in sorted(found) if self.rects[index].colliderect(bounds)]
+
+#  goblin pathfinding
+FLOW_CELL_SIZE = 25       # px; a 32x32 field over an 800x800 room
+FLOW_BLOCKED_COST = 1000  # stepping through a blocked cell is a last resort, only to get back out
+FLOW_NEIGHBOURS = [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]
+FLOW_SWEEPS_PER_TICK = 4  # relaxation passes per update (~0.07 ms each), so a re-flow spreads over a few ticks
+
+def _shifted(grid, dy, dx, fill):
+    """grid moved so each cell sees its (dy, dx) neighbour, fill past the edges."""
+    padded = np.pad(grid, 1, constant_values=fill)
+    h, w = grid.shape
+    return padded[1 + dy:1 + dy + h, 1 + dx:1 + dx + w]
+
+class FlowField:
+    """A room's walkability grid and the shortest-path flow toward the player's cell.
+
+    Every goblin samples the same field, so pathing costs one relaxation when the player
+    changes cell, not one search per chaser. The relaxation runs a few sweeps per tick;
+    until it settles, goblins keep following the last finished field.
+    """
+
+    def __init__(self, colliders, agent_size, cell_size=FLOW_CELL_SIZE):
+        self.cell_size = cell_size
+        self.shape = (ROOM_HEIGHT // cell_size, ROOM_WIDTH // cell_size)
+        ys, xs = np.indices(self.shape)
+        self.centres = np.stack(((xs + 0.5) * cell_size, (ys + 0.5) * cell_size), axis=-1)
+
+        # a cell is walkable when an agent centred on it clears every collider
+        w, h = agent_size
+        cx, cy = self.centres[..., 0], self.centres[..., 1]
+        blocked = np.zeros(self.shape, dtype=np.bool_)
+        for rect in colliders:
+            blocked |= (cx - w / 2 < rect.right) & (cx + w / 2 > rect.left) & (cy - h / 2 < rect.bottom) & (cy + h / 2 > rect.top)
+        self.walkable = ~blocked
+        self.penalty = np.where(blocked, float(FLOW_BLOCKED_COST), 1.0)
+
+        # (dy, dx, cost of the step from each cell's neighbour): diagonals may not cut a blocked corner
+        self.moves = []
+        for dy, dx in FLOW_NEIGHBOURS:
+            allowed = _shifted(np.ones(self.shape, dtype=np.bool_), dy, dx, False)
+            if dy and dx:
+                allowed &= _shifted(self.walkable, dy, 0, False) & _shifted(self.walkable, 0, dx, False)
+            self.moves.append((dy, dx, np.where(allowed, np.hypot(dy, dx) * self.penalty, np.inf)))
+
+        self.solids = np.array([(r.left, r.top, r.right, r.bottom) for r in colliders], dtype=float).reshape(-1, 4)
+        h, w = self.shape
+        self.dist = np.full((h + 2, w + 2), np.inf)   # padded, so neighbour views are plain slices
+        self.source = None    # cell the published waypoints lead to
+        self.pending = None   # cell the wavefront in dist is still relaxing toward
+        self.step = np.empty(self.shape)
+        self.waypoints = np.full(self.shape + (2,), np.nan)   # centre of each cell's next hop
+
+    def _neighbour(self, dy, dx):
+        h, w = self.shape
+        return self.dist[1 + dy:1 + dy + h, 1 + dx:1 + dx + w]
+
+    def cells_of(self, points):
+        """(row, col) index arrays of the cells holding points."""
+        cells = np.floor_divide(points, self.cell_size).astype(np.intp)
+        return (np.clip(cells[..., 1], 0, self.shape[0] - 1), np.clip(cells[..., 0], 0, self.shape[1] - 1))
+
+    def update(self, target):
+        """Advance the re-flow toward target's cell, starting one if the field points elsewhere."""
+        if self.pending is None:
+            row, col = self.cells_of(np.asarray(target, dtype=float))
+            if (row, col) == self.source:
+                return
+            self.pending = (row, col)
+            dist = self._neighbour(0, 0)
+            dist.fill(np.inf)
+            dist[row, col] = 0.0
+
+        # the first field in a room is solved outright, so a chase never starts without one
+        if self._relax(math.inf if self.source is None else FLOW_SWEEPS_PER_TICK):
+            self.source, self.pending = self.pending, None
+            self._publish()
+
+    def _relax(self, max_sweeps):
+        """Dijkstra as a vectorised wavefront: relax every cell against its neighbours, True once stable."""
+        dist, step = self._neighbour(0, 0), self.step
+        sweeps = 0
+        while sweeps < max_sweeps:
+            sweeps += 1
+            changed = False
+            for dy, dx, cost in self.moves:
+                np.add(self._neighbour(dy, dx), cost, out=step)
+                if (step < dist).any():
+                    np.minimum(dist, step, out=dist)
+                    changed = True
+            if not changed:
+                return True
+        return False
 
-    # place static objects like rocks and portal frame
-    for obj in room_info.get("objects", []):
-        draw_object(obj["x"], obj["y"], obj["type"], surface, level, obj["width"], obj["height"])
+    def _publish(self):
+        """Point each cell at its cheapest neighbour; the target cell and unreachable ones get none."""
+        row, col = self.source
+        step = self.step
+        best = np.full(self.shape, np.inf)
+        self.waypoints.fill(np.nan)
+        for dy, dx, cost in self.moves:
+            np.add(self._neighbour(dy, dx), cost, out=step)
+            better = step < best
+            best[better] = step[better]
+            self.waypoints[better] = self.centres[better] + (dx * self.cell_size, dy * self.cell_size)
+        self.waypoints[row, col] = np.nan
+
+    def overlapping(self, corners, size):
+        """Which agent rects (truncated, like Rect) overlap a collider."""
+        w, h = size
+        x, y = np.trunc(corners[:, 0, None]), np.trunc(corners[:, 1, None])
+        left, top, right, bottom = self.solids.T
+        return ((x < right) & (x + w > left) & (y < bottom) & (y + h > top)).any(axis=1)
+
+    def slide(self, start, pos, size):
+        """Undo, one axis at a time, any part of a move from start to pos that walks into a collider."""
+        stuck = self.overlapping(start, size)   # already inside one: let it walk back out
+        for axis in (0, 1):
+            trial = start.copy()
+            trial[:, axis] = pos[:, axis]
+            blocked = self.overlapping(trial, size) & ~stuck
+            pos[blocked, axis] = start[blocked, axis]
+            start[:, axis] = pos[:, axis]
+
+    def steer(self, points, target):
+        """Where each point should head next: its cell's waypoint, or straight at target."""
+        waypoints = self.waypoints[self.cells_of(points)]
+        return np.where(np.isnan(waypoints), target, waypoints)
+
+#  line of sight
+SIGHT_CELL_SIZE = 25      # px per occupancy cell
+SIGHT_CACHE_LIMIT = 8192  # (from cell, to cell) answers kept per room before starting over
+
+class SightGrid:
+    """A room's occupancy grid, answering "can a see b?" with a DDA raycast cached per cell pair."""
+
+    def __init__(self, colliders, cell_size=SIGHT_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cols, self.rows = ROOM_WIDTH // cell_size, ROOM_HEIGHT // cell_size
+        occupied = np.zeros((self.rows, self.cols), dtype=np.bool_)
+        for rect in colliders:
+            occupied[max(0, rect.top // cell_size):(rect.bottom - 1) // cell_size + 1,
+                     max(0, rect.left // cell_size):(rect.right - 1) // cell_size + 1] = True
+        self.occupied = occupied.tolist()   # the ray walk reads single cells, which lists do faster
+        self.cache = {}
+
+    def cell_of(self, point):
+        x, y = point
+        return (min(max(int(x // self.cell_size), 0), self.cols - 1),
+                min(max(int(y // self.cell_size), 0), self.rows - 1))
+
+    def can_see(self, source, target):
+        """True when no occupied cell lies between the cells of source and target."""
+        key = (self.cell_of(source), self.cell_of(target))
+        seen = self.cache.get(key)
+        if seen is None:
+            if len(self.cache) >= SIGHT_CACHE_LIMIT:
+                self.cache.clear()
+            seen = self.cache[key] = self._raycast(*key)
+        return seen
+
+    def _raycast(self, start, end):
+        """Step cell by cell from one cell centre to another (Amanatides-Woo DDA)."""
+        (x, y), (end_x, end_y) = start, end
+        dx, dy = end_x - x, end_y - y
+        step_x, step_y = (1 if dx > 0 else -1), (1 if dy > 0 else -1)
+        # distance along the ray to the next x / y border, scaled by 2*|dx|*|dy| to stay in integers
+        # so corner crossings compare exactly; the first border is half a cell from the centre
+        delta_x, delta_y = 2 * abs(dy), 2 * abs(dx)
+        next_x, next_y = abs(dy), abs(dx)
+        while (x, y) != (end_x, end_y):
+            if next_x < next_y:
+                x += step_x
+                next_x += delta_x
+            elif next_y < next_x:
+                y += step_y
+                next_y += delta_y
+            else:   # straight through a corner
+                x += step_x
+                y += step_y
+                next_x += delta_x
+                next_y += delta_y
+            if (x, y) != (end_x, end_y) and self.occupied[y][x]:
+                return False
+        return True
 
-    # place interactive props such as levers and chests
-    for inter in room_info.get("interactive", []):
-        draw_object(inter["x"], inter["y"], inter["type"], surface, level, inter["width"], inter["height"])
+#  compiled rooms
+SOLID_OBJECTS = ["tree", "rock", "building", "bridge_wall", "bridge"]
+INTERACTIVE_OBJECTS = ["anvil", "campfire", "cage", "lever", "portal", "bookshelf", "rune", "safe"]
+PICKUP_SIZES = {"key": (45, 45), "timeshard": (50, 50)}   # keys and shards are grabbed by a fixed box
+INTERACT_REACH = 50   # how far past a prop or NPC the player can still press F
+
+class NPC:
+    """A talkable NPC compiled from its room_data entry."""
+    __slots__ = ("id", "rect", "data")
+
+    def __init__(self, data):
+        self.id = data["id"]
+        self.data = data   # the room_data entry
+        self.rect = pygame.Rect((data["x"], data["y"]), get_npc_size(self.id))
+
+class Item:
+    """A collectible compiled from its room_data entry; id is its index in the room's item list."""
+    __slots__ = ("id", "type", "x", "y", "rect")
+
+    def __init__(self, item_id, item_type, x, y):
+        self.id = item_id
+        self.type = item_type
+        self.x = x
+        self.y = y
+        if item_type in PICKUP_SIZES:
+            self.rect = pygame.Rect((x, y), PICKUP_SIZES[item_type]).inflate(20, 20)
+        else:
+            self.rect = pygame.Rect((x, y), get_item_size(item_type))
+
+class Trigger:
+    """A proximity volume around a prop or NPC; standing in one lets F (or G) act on its target."""
+    __slots__ = ("rect", "type", "target", "centre")
+
+    def __init__(self, rect, trigger_type, target):
+        self.rect = rect.inflate(INTERACT_REACH, INTERACT_REACH)
+        self.type = trigger_type   # the prop's type, or "npc"
+        self.target = target       # the interactive object dict or the NPC
+        self.centre = rect.center
+
+class Room:
+    """A room_data entry compiled into the rects and typed lists gameplay reads every frame."""
+
+    def __init__(self, key, info, knight_rescued=False):
+        self.key = key
+        self.variant = (key, knight_rescued)   # rooms and static layers are cached per variant
+        self.info = info
+        self.name = info.get("name", f"Room ({key[1]},{key[2]})")
+        self.objects = info.get("objects", []) + info.get("interactive", [])
+        self.friendly_npcs = list(_friendly_npcs(info, knight_rescued))
+        self.colliders = []
+        self.damage_zones = []
+        self.interactive_objects = []   # {"rect", "type", "x", "y"}
+        self.npcs = []                  # NPCs the player can talk to
+        self.items = []                 # Item per room_data entry on the ground, in draw order
+        self._uncollected_mask = None   # collected bitset the cached uncollected list was built for
+        self.triggers = []              # Trigger per interactive object, then per NPC
+        self.flow = None                # FlowField, built the first time goblins chase here
+
+        for obj in self.objects:
+            self._add_object(obj)
+        for npc, rescued in self.friendly_npcs:
+            self._add_npc(npc, rescued)
+        for item_id, item in enumerate(info.get("items", [])):
+            # drops only show up once whoever drops them has been rescued
+            if item.get("dropped_by") == "knight" and not knight_rescued:
+                continue
+            self.items.append(Item(item_id, item["type"], item["x"], item["y"]))
+        self.triggers += [Trigger(obj["rect"], obj["type"], obj) for obj in self.interactive_objects]
+        self.triggers += [Trigger(npc.rect, "npc", npc) for npc in self.npcs]
+        self.trigger_rects = [trigger.rect for trigger in self.triggers]
+        self.collision = CollisionGrid(self.colliders)
+        self.sight = SightGrid(self.colliders)
+
+    def _add_object(self, obj):
+        obj_type = obj["type"]
+        rect = pygame.Rect(obj["x"], obj["y"], obj["width"], obj["height"])
+        if obj_type == "invisible" or obj_type in SOLID_OBJECTS:
+            self.colliders.append(rect)
+        elif obj_type == "damage":
+            self.damage_zones.append(rect)
+        if obj_type in INTERACTIVE_OBJECTS:
+            self.interactive_objects.append({"rect": rect, "type": obj_type, "x": obj["x"], "y": obj["y"]})
+            if obj_type != "portal":
+                self.colliders.append(rect)
+
+    def _add_npc(self, npc, rescued):
+        # a rescued knight steps aside, so it no longer blocks or talks from its cage spot
+        if rescued:
+            return
+        npc = NPC(npc)
+        self.colliders.append(npc.rect)
+        self.npcs.append(npc)
+
+    def uncollected(self, mask):
+        """Items still lying around under collected bitset mask, and their pickup rects."""
+        if mask != self._uncollected_mask:
+            self._uncollected = [item for item in self.items if not mask >> item.id & 1]
+            self._uncollected_rects = [item.rect for item in self._uncollected]
+            self._uncollected_mask = mask
+        return self._uncollected, self._uncollected_rects
+
+rooms = {}   # (room key, knight rescued) -> Room
+KNIGHT_ROOM = (0, 1, 0)   # the only room that compiles differently once the knight is free
+
+def room_variant(room_key, knight_rescued=False):
+    room_key = tuple(room_key)
+    return room_key, knight_rescued and room_key == KNIGHT_ROOM
+
+def compile_room(room_key, knight_rescued=False):
+    """Compile one room as it looks with the knight caged or rescued."""
+    room_key, knight_rescued = room_variant(room_key, knight_rescued)
+    room = Room(room_key, room_data.get(room_key, {}), knight_rescued)
+    rooms[room.variant] = room
+    return room
+
+def get_room(room_key, knight_rescued=False):
+    """Return the compiled room for a key, compiling empty grid cells and the rescued variant on demand."""
+    room = rooms.get(room_variant(room_key, knight_rescued))
+    return room if room is not None else compile_room(room_key, knight_rescued)
+
+def compile_rooms():
+    """Compile every room_data entry up front."""
+    for room_key in room_data:
+        compile_room(room_key)
+
+compile_rooms()
+
+#  proximity triggers
+def update_triggers(state, room):
+    """Work out which of room's trigger volumes hold the player and fire enter/exit for the changes."""
+    inside = [room.triggers[index] for index in state.player.collidelistall(room.trigger_rects)]
+    for trigger in list(state.nearby_triggers):
+        if trigger not in inside:
+            trigger_exited(state, trigger)
+    for trigger in inside:
+        if trigger not in state.nearby_triggers:
+            trigger_entered(state, trigger)
+
+def trigger_entered(state, trigger):
+    state.nearby_triggers.append(trigger)
+
+def trigger_exited(state, trigger):
+    state.nearby_triggers.remove(trigger)
+
+def nearest_trigger(state, npc_id=None):
+    """The trigger whose target is closest to the player, optionally only around NPCs with npc_id."""
+    best, best_dist = None, None
+    for trigger in state.nearby_triggers:
+        if npc_id is not None and (trigger.type != "npc" or trigger.target.id != npc_id):
+            continue
+        dist = (trigger.centre[0] - state.player.centerx) ** 2 + (trigger.centre[1] - state.player.centery) ** 2
+        if best is None or dist < best_dist:
+            best, best_dist = trigger, dist
+    return best
 
-    # draw friendly npcs while goblins and boss are handled elsewhere
-    for npc in room_info.get("npcs", []):
-        if npc.get("id") in ["goblin", "boss1"]:
-            continue  
-        
-        # track if the knight has been rescued so we render the right state
-        rescued = False
-        if npc.get("id") == "knight":
-            rescued = npc.get("rescued", False)
-        
-        draw_npc(surface, npc["x"], npc["y"], npc["id"], rescued)
+def draw_room(state, surface, room):
+    """Draw the current room using images only."""
+    level, row, col = room_key = room.key
+
+    # background, props and friendly npcs never move, so they come from one cached surface
+    restore_static_layer(surface, get_static_layer(room))
 
     # Draw enemies
-    draw_goblins(surface, room_key)
+    draw_goblins(state, surface, room_key)
     
     # Draw boss if in throne room
-    if room_key == (0, 2, 0) and boss and boss["alive"]:
-        draw_boss(surface)
+    if room_key == (0, 2, 0) and state.boss and state.boss.alive:
+        draw_boss(state, surface)
     
     # Draw boss drops if defeated
-    if room_key == (0, 2, 0) and boss_defeated and not boss_drop_collected:
-        draw_boss_drops(surface)
+    if room_key == (0, 2, 0) and state.boss_defeated and not state.boss_drop_collected:
+        draw_boss_drops(state, surface)
 
     # Draw items
-    for item in room_info.get("items", []):
-        draw_item(surface, item["x"], item["y"], item["type"], item.get("id", ""))
+    for item in room.uncollected(collected_mask(state, room_key))[0]:
+        draw_item(surface, item)
 
-def draw_health_bar(surface):
+def draw_health_bar(state, surface):
     # always show the health bar near the bottom so the player knows their status
     """Draw permanent health bar at bottom middle of screen."""
     health_width = 400
@@ -1336,42 +2568,82 @@ def draw_health_bar(surface):
     health_y = ROOM_HEIGHT - 50
     
 
-    pygame.draw.rect(surface, (100, 0, 0), (health_x, health_y, health_width, 30))
+    mark_dirty(pygame.draw.rect(surface, (100, 0, 0), (health_x, health_y, health_width, 30)))
 
-    pygame.draw.rect(surface, (0, 255, 0), (health_x, health_y, health_width * (health / max_health), 30))
+    pygame.draw.rect(surface, (0, 255, 0), (health_x, health_y, health_width * (state.health / state.max_health), 30))
 
     pygame.draw.rect(surface, (255, 255, 255), (health_x, health_y, health_width, 30), 2)
     
 
-    health_text = font.render(f"Health: {int(health)}/{max_health}", True, (255, 255, 255))
-    surface.blit(health_text, (health_x + 10, health_y + 5))
-    
-
-    armor_text = small_font.render(f"Armor Level: {armor_level}", True, (200, 255, 200))
-    surface.blit(armor_text, (health_x + health_width - 150, health_y + 5))
-
-def draw_hud(surface):
-    # overlay that lets the player inspect inventory without pausing the world
-    """Draw HUD with inventory (health bar is now drawn separately)."""
-    if not hud_visible:
-        return
-    
-    overlay = pygame.Surface((ROOM_WIDTH, ROOM_HEIGHT), pygame.SRCALPHA)
-    overlay.fill((0, 0, 0, 200))
-    surface.blit(overlay, (0, 0))
-    
+    health_text = render_text(font, f"Health: {int(state.health)}/{state.max_health}", (255, 255, 255))
+    mark_dirty(surface.blit(health_text, (health_x + 10, health_y + 5)))
+    
+
+    armor_text = render_text(small_font, f"Armor Level: {state.armor_level}", (200, 255, 200))
+    mark_dirty(surface.blit(armor_text, (health_x + health_width - 150, health_y + 5)))
+
+#  retained overlay panels
+_dim_overlays = {}   # alpha -> full-screen translucent black surface
+
+class UIPanel:
+    """Overlay panel drawn once into a cached surface and rebuilt only when its inputs change."""
+
+    def __init__(self, build, dim_alpha):
+        self.build = build            # build(state, surface) draws the panel and returns its hit-test layout
+        self.dim_alpha = dim_alpha
+        self.surface = None
+        self.layout = None
+        self._inputs = None
+
+    def refresh(self, state, inputs):
+        """Rebuild the cached surface if the inputs changed, and return the layout."""
+        if self.surface is None or inputs != self._inputs:
+            if self.surface is None:
+                self.surface = pygame.Surface((ROOM_WIDTH, ROOM_HEIGHT), pygame.SRCALPHA)
+            self.surface.fill((0, 0, 0, 0))
+            self.layout = self.build(state, self.surface)
+            self._inputs = inputs
+        return self.layout
+
+    def draw(self, state, target, inputs):
+        """Dim the screen, blit the cached panel on top, and return the layout."""
+        layout = self.refresh(state, inputs)
+        dim = _dim_overlays.get(self.dim_alpha)
+        if dim is None:
+            dim = pygame.Surface((ROOM_WIDTH, ROOM_HEIGHT), pygame.SRCALPHA)
+            dim.fill((0, 0, 0, self.dim_alpha))
+            _dim_overlays[self.dim_alpha] = dim
+        invalidate_screen()
+        target.blit(dim, (0, 0))
+        target.blit(self.surface, (0, 0))
+        return layout
+
+def _build_hud(state, surface):
+    """Render the inventory list onto the HUD panel."""
     # Inventory
     y = 100
-    for item, count in inventory.items():
+    for item, count in state.inventory.items():
         if count > 0:
-            text = font.render(f"{item}: {count}", True, (255, 255, 255))
+            text = render_text(font, f"{item}: {count}", (255, 255, 255))
             surface.blit(text, (50, y))
             y += 30
 
-def draw_minimap(surface, level, row, col):
+hud_panel = UIPanel(_build_hud, 200)
+
+def _hud_inputs(state):
+    return tuple(state.inventory.items())
+
+def draw_hud(state, surface):
+    # overlay that lets the player inspect inventory without pausing the world
+    """Draw HUD with inventory (health bar is now drawn separately)."""
+    if not state.hud_visible:
+        return
+    hud_panel.draw(state, surface, _hud_inputs(state))
+
+def draw_minimap(state, surface, level, row, col):
     # small map to keep the player oriented inside the three by three grid
     """Draw minimap showing current room."""
-    if not map_visible:
+    if not state.map_visible:
         return
     
     map_size = 150
@@ -1379,7 +2651,7 @@ def draw_minimap(surface, level, row, col):
     map_x = ROOM_WIDTH - map_size - 20
     map_y = 20
     
-    pygame.draw.rect(surface, (0, 0, 0, 180), (map_x - 5, map_y - 5, map_size + 10, map_size + 10))
+    mark_dirty(pygame.draw.rect(surface, (0, 0, 0, 180), (map_x - 5, map_y - 5, map_size + 10, map_size + 10)))
     
     for r in range(3):
         for c in range(3):
@@ -1393,53 +2665,59 @@ def draw_minimap(surface, level, row, col):
             else:
                 pygame.draw.rect(surface, (100, 100, 100), rect)
     
-    room_name = room_data.get((level, row, col), {}).get("name", f"Room ({row},{col})")
-    name_text = small_font.render(room_name, True, (255, 255, 255))
-    surface.blit(name_text, (map_x, map_y + map_size + 10))
+    room_name = get_room((level, row, col)).name
+    name_text = render_text(small_font, room_name, (255, 255, 255))
+    mark_dirty(surface.blit(name_text, (map_x, map_y + map_size + 10)))
 
-def draw_quest_log(surface):
-    """Draw quest log."""
-    if not quest_log_visible:
-        return
-    
-    overlay = pygame.Surface((ROOM_WIDTH, ROOM_HEIGHT), pygame.SRCALPHA)
-    overlay.fill((0, 0, 0, 200))
-    surface.blit(overlay, (0, 0))
-    
+def _build_quest_log(state, surface):
+    """Render the active quests onto the quest log panel."""
     box = pygame.Rect(100, 100, 600, 500)
     pygame.draw.rect(surface, (20, 20, 40), box)
     pygame.draw.rect(surface, (255, 215, 0), box, 3)
     
-    title = title_font.render("QUEST LOG", True, (255, 215, 0))
+    title = render_text(title_font, "QUEST LOG", (255, 215, 0))
     surface.blit(title, (ROOM_WIDTH//2 - title.get_width()//2, 120))
     
     y = 180
-    for quest_id, quest_data in quests.items():
+    for quest_id, quest_data in state.quests.items():
         if quest_data["active"]:
             color = (150, 255, 150) if quest_data["complete"] else (255, 255, 255)
-            text = font.render(f"• {quest_data['description']}", True, color)
+            text = render_text(font, f"• {quest_data['description']}", color)
             surface.blit(text, (150, y))
             y += 40
 
-def draw_message(surface):
+quest_log_panel = UIPanel(_build_quest_log, 200)
+
+def _quest_log_changed(state, changed):
+    state.quest_log_revision = next(quest_log_revisions)
+
+subscribe_quests(_quest_log_changed)
+
+def draw_quest_log(state, surface):
+    """Draw quest log."""
+    if not state.quest_log_visible:
+        return
+    quest_log_panel.draw(state, surface, state.quest_log_revision)
+
+def draw_message(state, surface):
     """Display temporary messages."""
-    if message_timer > 0 and message:
-        msg = font.render(message, True, message_color)
+    if state.message_timer > 0 and state.message:
+        msg = render_text(font, state.message, state.message_color)
         rect = msg.get_rect(center=(ROOM_WIDTH // 2, 50))
-        pygame.draw.rect(surface, (0, 0, 0), rect.inflate(20, 10))
-        pygame.draw.rect(surface, message_color, rect.inflate(20, 10), 2)
+        mark_dirty(pygame.draw.rect(surface, (0, 0, 0), rect.inflate(20, 10)))
+        pygame.draw.rect(surface, state.message_color, rect.inflate(20, 10), 2)
         surface.blit(msg, rect)
 
-def draw_dialogue(surface):
+def draw_dialogue(state, surface):
     """Display NPC dialogue."""
-    if not dialogue_active or not current_dialogue:
+    if not state.dialogue_active or not state.current_dialogue:
         return
     
     box = pygame.Rect(50, ROOM_HEIGHT - 200, ROOM_WIDTH - 100, 150)
-    pygame.draw.rect(surface, (20, 20, 40), box)
+    mark_dirty(pygame.draw.rect(surface, (20, 20, 40), box))
     pygame.draw.rect(surface, (255, 215, 0), box, 3)
     
-    text = current_dialogue[dialogue_index]
+    text = state.current_dialogue[state.dialogue_index]
     lines = []
     words = text.split(" ")
     line = ""
@@ -1455,22 +2733,16 @@ def draw_dialogue(surface):
     
     y = box.y + 20
     for line in lines:
-        rendered = font.render(line, True, (255, 255, 255))
+        rendered = render_text(font, line, (255, 255, 255))
         surface.blit(rendered, (box.x + 20, y))
         y += 30
     
-    hint = small_font.render("Press SPACE to continue...", True, (200, 200, 200))
+    hint = render_text(small_font, "Press SPACE to continue...", (200, 200, 200))
     surface.blit(hint, (box.right - 180, box.bottom - 30))
 
-def draw_blacksmith_shop(surface):
-    """Draw the improved blacksmith shop interface."""
-    if not upgrade_shop_visible:
-        return
-    
-    overlay = pygame.Surface((ROOM_WIDTH, ROOM_HEIGHT), pygame.SRCALPHA)
-    overlay.fill((0, 0, 0, 220))
-    surface.blit(overlay, (0, 0))
-    
+def _build_blacksmith_shop(state, surface):
+    """Render the shop panel and return its (item buttons, close button) layout."""
+    inventory = state.inventory
 
     shop_rect = pygame.Rect(50, 50, ROOM_WIDTH - 100, ROOM_HEIGHT - 100)
     pygame.draw.rect(surface, (40, 30, 20), shop_rect)
@@ -1481,7 +2753,7 @@ def draw_blacksmith_shop(surface):
     pygame.draw.rect(surface, (60, 40, 20), title_bg)
     pygame.draw.rect(surface, (220, 180, 80), title_bg, 3)
     
-    title = title_font.render("BLACKSMITH'S FORGE", True, (255, 200, 100))
+    title = render_text(title_font, "BLACKSMITH'S FORGE", (255, 200, 100))
     surface.blit(title, (ROOM_WIDTH//2 - title.get_width()//2, shop_rect.y + 10))
     
 
@@ -1489,7 +2761,7 @@ def draw_blacksmith_shop(surface):
     pygame.draw.rect(surface, (30, 30, 40), gold_rect)
     pygame.draw.rect(surface, (255, 215, 0), gold_rect, 2)
     
-    gold_text = font.render(f"Your Gold: {inventory['Gold']}", True, (255, 215, 0))
+    gold_text = render_text(font, f"Your Gold: {inventory['Gold']}", (255, 215, 0))
     surface.blit(gold_text, (gold_rect.centerx - gold_text.get_width()//2, gold_rect.centery - gold_text.get_height()//2))
     
 
@@ -1498,12 +2770,12 @@ def draw_blacksmith_shop(surface):
     pygame.draw.rect(surface, (100, 150, 200), stats_rect, 2)
     
     stats_lines = [
-        f"Weapon: {'Equipped' if has_weapon else 'None'} (Lvl {weapon_level}) | Damage: {20 + (weapon_level * 5)}",
-        f"Armor: Lvl {armor_level} | Health: {max_health} | Ammo: {ammo}/{max_ammo}"
+        f"Weapon: {'Equipped' if state.has_weapon else 'None'} (Lvl {state.weapon_level}) | Damage: {20 + (state.weapon_level * 5)}",
+        f"Armor: Lvl {state.armor_level} | Health: {state.max_health} | Ammo: {state.ammo}/{max_ammo}"
     ]
     
     for i, line in enumerate(stats_lines):
-        stat_text = small_font.render(line, True, (200, 220, 255))
+        stat_text = render_text(small_font, line, (200, 220, 255))
         surface.blit(stat_text, (stats_rect.x + 10, stats_rect.y + 10 + i * 20))
     
 
@@ -1512,8 +2784,8 @@ def draw_blacksmith_shop(surface):
     pygame.draw.rect(surface, (180, 150, 100), items_rect, 2)
     
 
-    basic_header = font.render("BASIC ITEMS:", True, (255, 200, 100))
-    upgrade_header = font.render("UPGRADES:", True, (255, 200, 100))
+    basic_header = render_text(font, "BASIC ITEMS:", (255, 200, 100))
+    upgrade_header = render_text(font, "UPGRADES:", (255, 200, 100))
     surface.blit(basic_header, (items_rect.x + 10, items_rect.y + 10))
     surface.blit(upgrade_header, (items_rect.x + items_rect.width//2 + 10, items_rect.y + 10))
     
@@ -1522,7 +2794,7 @@ def draw_blacksmith_shop(surface):
     y_offset_upgrade = items_rect.y + 50
     item_buttons = []
     
-    for item_id, item_data in blacksmith_items.items():
+    for item_id, item_data in state.blacksmith_items.items():
        
         if item_data["type"] in ["weapon", "consumable"]:
             # Basic items column (left)
@@ -1537,7 +2809,7 @@ def draw_blacksmith_shop(surface):
         if item_data.get("purchased", False):
             bg_color = (40, 60, 40)  # Greenish for purchased
             border_color = (100, 200, 100)
-        elif inventory["Gold"] >= item_data["cost"] and _can_purchase_item(item_id):
+        elif inventory["Gold"] >= item_data["cost"] and _can_purchase_item(state, item_id):
             bg_color = (50, 50, 60)  # Normal for affordable
             border_color = (150, 150, 200)
         else:
@@ -1548,9 +2820,9 @@ def draw_blacksmith_shop(surface):
         pygame.draw.rect(surface, border_color, item_bg, 3)
         
         # Item name and description
-        name_text = font.render(item_data["name"], True, (255, 255, 255))
-        desc_text = small_font.render(item_data["description"], True, (200, 200, 200))
-        cost_text = font.render(f"{item_data['cost']} Gold", True, (255, 215, 0))
+        name_text = render_text(font, item_data["name"], (255, 255, 255))
+        desc_text = render_text(small_font, item_data["description"], (200, 200, 200))
+        cost_text = render_text(font, f"{item_data['cost']} Gold", (255, 215, 0))
         
         surface.blit(name_text, (item_bg.x + 10, item_bg.y + 10))
         surface.blit(desc_text, (item_bg.x + 10, item_bg.y + 35))
@@ -1558,20 +2830,20 @@ def draw_blacksmith_shop(surface):
         
         # Purchase status or button
         if item_data.get("purchased", False):
-            status_text = font.render("PURCHASED", True, (100, 255, 100))
+            status_text = render_text(font, "PURCHASED", (100, 255, 100))
             surface.blit(status_text, (item_bg.x + item_bg.width - 110, item_bg.y + 40))
         else:
             button_rect = pygame.Rect(item_bg.x + item_bg.width - 100, item_bg.y + 40, 90, 30)
-            can_purchase = inventory["Gold"] >= item_data["cost"] and _can_purchase_item(item_id)
+            can_purchase = inventory["Gold"] >= item_data["cost"] and _can_purchase_item(state, item_id)
             
             if can_purchase:
                 pygame.draw.rect(surface, (80, 120, 80), button_rect)
                 pygame.draw.rect(surface, (120, 200, 120), button_rect, 2)
-                button_text = small_font.render("BUY", True, (200, 255, 200))
+                button_text = render_text(small_font, "BUY", (200, 255, 200))
             else:
                 pygame.draw.rect(surface, (120, 80, 80), button_rect)
                 pygame.draw.rect(surface, (200, 120, 120), button_rect, 2)
-                button_text = small_font.render("BUY", True, (255, 200, 200))
+                button_text = render_text(small_font, "BUY", (255, 200, 200))
             
             surface.blit(button_text, (button_rect.centerx - button_text.get_width()//2, 
                                      button_rect.centery - button_text.get_height()//2))
@@ -1581,122 +2853,123 @@ def draw_blacksmith_shop(surface):
     close_rect = pygame.Rect(shop_rect.centerx - 50, shop_rect.bottom - 50, 100, 40)
     pygame.draw.rect(surface, (120, 80, 80), close_rect)
     pygame.draw.rect(surface, (200, 120, 120), close_rect, 2)
-    close_text = font.render("CLOSE", True, (255, 255, 255))
+    close_text = render_text(font, "CLOSE", (255, 255, 255))
     surface.blit(close_text, (close_rect.centerx - close_text.get_width()//2, 
                             close_rect.centery - close_text.get_height()//2))
     
     return item_buttons, close_rect
 
+blacksmith_panel = UIPanel(_build_blacksmith_shop, 220)
+
+def _blacksmith_shop_inputs(state):
+    purchased = tuple(item["purchased"] for item in state.blacksmith_items.values())
+    return (state.inventory["Gold"], state.has_weapon, state.weapon_level, state.armor_level, state.max_health, state.ammo, max_ammo, purchased)
+
+def draw_blacksmith_shop(state, surface):
+    """Draw the improved blacksmith shop interface."""
+    if not state.upgrade_shop_visible:
+        return
+    return blacksmith_panel.draw(state, surface, _blacksmith_shop_inputs(state))
 
-def _can_purchase_item(item_id):
+def _can_purchase_item(state, item_id):
     """Check if an item can be purchased based on game state."""
-    item = blacksmith_items[item_id]
+    item = state.blacksmith_items[item_id]
     
     if item_id == "weapon":
         return not item["purchased"] 
     
     elif item_id == "armor_upgrade":
-        return armor_level < 5  
+        return state.armor_level < 5  
     
     elif item_id == "weapon_upgrade":
-        return has_weapon and weapon_level < 5  
+        return state.has_weapon and state.weapon_level < 5  
     
     elif item_id in ["ammo_pack", "health_potion"]:
         return True 
     
     return False
 
-def handle_blacksmith_purchase(item_id):
+def handle_blacksmith_purchase(state, item_id):
     """Handle purchasing items from the blacksmith."""
-    global has_weapon, ammo, max_ammo, health, max_health, inventory, weapon_level, armor_level
-    
-    item = blacksmith_items[item_id]
+    item = state.blacksmith_items[item_id]
     
     if item.get("purchased", False):
-        set_message(f"You already purchased the {item['name']}!", (255, 200, 0), 2.0)
+        set_message(state, f"You already purchased the {item['name']}!", (255, 200, 0), 2.0)
         return False
     
-    if inventory["Gold"] < item["cost"]:
-        set_message(f"Not enough gold for {item['name']}!", (255, 0, 0), 2.0)
+    if state.inventory["Gold"] < item["cost"]:
+        set_message(state, f"Not enough gold for {item['name']}!", (255, 0, 0), 2.0)
         return False
     
-    if not _can_purchase_item(item_id):
-        if item_id == "weapon_upgrade" and not has_weapon:
-            set_message("You need to buy a weapon first!", (255, 200, 0), 2.0)
-        elif item_id == "weapon_upgrade" and weapon_level >= 5:
-            set_message("Weapon is already at maximum level!", (255, 200, 0), 2.0)
-        elif item_id == "armor_upgrade" and armor_level >= 5:
-            set_message("Armor is already at maximum level!", (255, 200, 0), 2.0)
+    if not _can_purchase_item(state, item_id):
+        if item_id == "weapon_upgrade" and not state.has_weapon:
+            set_message(state, "You need to buy a weapon first!", (255, 200, 0), 2.0)
+        elif item_id == "weapon_upgrade" and state.weapon_level >= 5:
+            set_message(state, "Weapon is already at maximum level!", (255, 200, 0), 2.0)
+        elif item_id == "armor_upgrade" and state.armor_level >= 5:
+            set_message(state, "Armor is already at maximum level!", (255, 200, 0), 2.0)
         else:
-            set_message(f"Cannot purchase {item['name']} right now!", (255, 200, 0), 2.0)
+            set_message(state, f"Cannot purchase {item['name']} right now!", (255, 200, 0), 2.0)
         return False
     
 
-    inventory["Gold"] -= item["cost"]
+    state.inventory["Gold"] -= item["cost"]
     
 
     if item_id == "weapon":
         item["purchased"] = True
-        has_weapon = True
-        ammo = max_ammo 
-        set_message(f"Purchased {item['name']}! You can now shoot with SPACE.", (0, 255, 0), 3.0)
-        quests["buy_weapon"]["complete"] = True
-        quests["upgrade_sword"]["active"] = True
+        state.has_weapon = True
+        state.ammo = max_ammo 
+        set_message(state, f"Purchased {item['name']}! You can now shoot with SPACE.", (0, 255, 0), 3.0)
     
     elif item_id == "ammo_pack":
-        ammo = min(max_ammo, ammo + 30)
-        set_message(f"Purchased {item['name']}! Ammo: {ammo}/{max_ammo}", (0, 255, 0), 2.0)
+        state.ammo = min(max_ammo, state.ammo + 30)
+        set_message(state, f"Purchased {item['name']}! Ammo: {state.ammo}/{max_ammo}", (0, 255, 0), 2.0)
     
     elif item_id == "health_potion":
-        health = min(max_health, health + 30)
-        set_message(f"Used {item['name']}! +30 Health", (0, 255, 0), 2.0)
+        state.health = min(state.max_health, state.health + 30)
+        set_message(state, f"Used {item['name']}! +30 Health", (0, 255, 0), 2.0)
     
     elif item_id == "armor_upgrade":
-        armor_level += 1
-        max_health = 100 + (armor_level * 20)
-        health = max_health  
-        set_message(f"Armor upgraded to level {armor_level}! Max health: {max_health}", (0, 255, 0), 2.0)
+        state.armor_level += 1
+        state.max_health = 100 + (state.armor_level * 20)
+        state.health = state.max_health  
+        set_message(state, f"Armor upgraded to level {state.armor_level}! Max health: {state.max_health}", (0, 255, 0), 2.0)
         
 
-        if armor_level >= 5:
+        if state.armor_level >= 5:
             item["purchased"] = True
     
     elif item_id == "weapon_upgrade":
-        weapon_level += 1
-        set_message(f"Weapon upgraded to level {weapon_level}! Damage: {20 + (weapon_level * 5)}", (0, 255, 0), 2.0)
+        state.weapon_level += 1
+        set_message(state, f"Weapon upgraded to level {state.weapon_level}! Damage: {20 + (state.weapon_level * 5)}", (0, 255, 0), 2.0)
         
 
-        if weapon_level >= 5:
+        if state.weapon_level >= 5:
             item["purchased"] = True
     
+    publish(state, "purchase", item_id)
     return True
 
 
-def draw_safe_puzzle(surface):
-    """Draw the safe puzzle interface."""
-    if not safe_visible:
-        return
-    
-    overlay = pygame.Surface((ROOM_WIDTH, ROOM_HEIGHT), pygame.SRCALPHA)
-    overlay.fill((0, 0, 0, 200))
-    surface.blit(overlay, (0, 0))
-    
+def _build_safe_puzzle(state, surface):
+    """Render the keypad panel and return its (number buttons, clear, close) layout."""
     box = pygame.Rect(200, 200, 400, 300)
     pygame.draw.rect(surface, (50, 50, 70), box)
     pygame.draw.rect(surface, (200, 180, 50), box, 4)
     
-    title = font.render("SAFE LOCK", True, (255, 215, 0))
+    title = render_text(font, "SAFE LOCK", (255, 215, 0))
     surface.blit(title, (ROOM_WIDTH//2 - title.get_width()//2, 220))
     
     # Display current input
-    input_text = font.render(f"Code: {safe_input}", True, (255, 255, 255))
+    input_text = render_text(font, f"Code: {state.safe_input}", (255, 255, 255))
     surface.blit(input_text, (ROOM_WIDTH//2 - input_text.get_width()//2, 280))
     
-    if safe_unlocked:
-        success_text = font.render("SAFE UNLOCKED! Key found!", True, (0, 255, 0))
+    if state.safe_unlocked:
+        success_text = render_text(font, "SAFE UNLOCKED! Key found!", (0, 255, 0))
         surface.blit(success_text, (ROOM_WIDTH//2 - success_text.get_width()//2, 320))
     else:
-        hint_text = small_font.render("Enter the 4-digit code", True, (200, 200, 200))
+        hint_text = render_text(small_font, "Enter the 4-digit code", (200, 200, 200))
         surface.blit(hint_text, (ROOM_WIDTH//2 - hint_text.get_width()//2, 320))
     
     # Number buttons - repositioned to avoid overlap
@@ -1711,7 +2984,7 @@ def draw_safe_puzzle(surface):
             pygame.draw.rect(surface, (80, 80, 100), button_rect)
             pygame.draw.rect(surface, (200, 200, 220), button_rect, 2)
             
-            num_text = font.render(str(num), True, (255, 255, 255))
+            num_text = render_text(font, str(num), (255, 255, 255))
             surface.blit(num_text, (x + button_size//2 - num_text.get_width()//2, 
                                   y + button_size//2 - num_text.get_height()//2))
             buttons.append((button_rect, str(num)))
@@ -1720,7 +2993,7 @@ def draw_safe_puzzle(surface):
     clear_rect = pygame.Rect(box.x + 50, box.y + 270, 80, 40)  
     pygame.draw.rect(surface, (180, 80, 80), clear_rect)
     pygame.draw.rect(surface, (220, 150, 150), clear_rect, 2)
-    clear_text = small_font.render("CLEAR", True, (255, 255, 255))
+    clear_text = render_text(small_font, "CLEAR", (255, 255, 255))
     surface.blit(clear_text, (clear_rect.centerx - clear_text.get_width()//2, 
                             clear_rect.centery - clear_text.get_height()//2))
     
@@ -1728,21 +3001,25 @@ def draw_safe_puzzle(surface):
     close_rect = pygame.Rect(box.x + 270, box.y + 270, 80, 40)  
     pygame.draw.rect(surface, (80, 80, 180), close_rect)
     pygame.draw.rect(surface, (150, 150, 220), close_rect, 2)
-    close_text = small_font.render("CLOSE", True, (255, 255, 255))
+    close_text = render_text(small_font, "CLOSE", (255, 255, 255))
     surface.blit(close_text, (close_rect.centerx - close_text.get_width()//2, 
                             close_rect.centery - close_text.get_height()//2))
     
     return buttons, clear_rect, close_rect
 
-def draw_maze_puzzle(surface):
-    """Draw the maze puzzle interface."""
-    if not maze_visible:
+safe_panel = UIPanel(_build_safe_puzzle, 200)
+
+def _safe_puzzle_inputs(state):
+    return (state.safe_input, state.safe_unlocked)
+
+def draw_safe_puzzle(state, surface):
+    """Draw the safe puzzle interface."""
+    if not state.safe_visible:
         return
-    
-    overlay = pygame.Surface((ROOM_WIDTH, ROOM_HEIGHT), pygame.SRCALPHA)
-    overlay.fill((0, 0, 0, 200))
-    surface.blit(overlay, (0, 0))
-    
+    return safe_panel.draw(state, surface, _safe_puzzle_inputs(state))
+
+def _build_maze_puzzle(state, surface):
+    """Render the maze panel and return its close button."""
     # Calculate maze position to center it
     maze_total_width = maze_width * maze_cell_size
     maze_total_height = maze_height * maze_cell_size
@@ -1755,11 +3032,11 @@ def draw_maze_puzzle(surface):
     pygame.draw.rect(surface, (255, 215, 0), maze_bg, 3)
     
     # Draw title
-    title = font.render("MAZE PUZZLE - Free the Knight!", True, (255, 215, 0))
+    title = render_text(font, "MAZE PUZZLE - Free the Knight!", (255, 215, 0))
     surface.blit(title, (ROOM_WIDTH//2 - title.get_width()//2, maze_y - 30))
     
     # Draw instructions
-    instructions = small_font.render("Use arrow keys to navigate to the exit (green square)", True, (200, 200, 200))
+    instructions = render_text(small_font, "Use arrow keys to navigate to the exit (green square)", (200, 200, 200))
     surface.blit(instructions, (ROOM_WIDTH//2 - instructions.get_width()//2, maze_y + maze_total_height + 10))
     
     # Draw maze
@@ -1784,8 +3061,8 @@ def draw_maze_puzzle(surface):
     pygame.draw.rect(surface, (0, 255, 0), exit_rect, 2)
     
     # Draw player
-    player_x = maze_x + maze_player_pos[0] * maze_cell_size
-    player_y = maze_y + maze_player_pos[1] * maze_cell_size
+    player_x = maze_x + state.maze_player_pos[0] * maze_cell_size
+    player_y = maze_y + state.maze_player_pos[1] * maze_cell_size
     player_rect = pygame.Rect(player_x + 5, player_y + 5, maze_cell_size - 10, maze_cell_size - 10)
     pygame.draw.rect(surface, (255, 100, 100), player_rect)
     
@@ -1793,18 +3070,40 @@ def draw_maze_puzzle(surface):
     close_rect = pygame.Rect(maze_x + maze_total_width - 90, maze_y + maze_total_height + 10, 80, 25)
     pygame.draw.rect(surface, (180, 80, 80), close_rect)
     pygame.draw.rect(surface, (220, 150, 150), close_rect, 2)
-    close_text = small_font.render("CLOSE", True, (255, 255, 255))
+    close_text = render_text(small_font, "CLOSE", (255, 255, 255))
     surface.blit(close_text, (close_rect.centerx - close_text.get_width()//2, 
                             close_rect.centery - close_text.get_height()//2))
     
     return close_rect
 
-def handle_maze_input():
+maze_panel = UIPanel(_build_maze_puzzle, 200)
+
+def _maze_puzzle_inputs(state):
+    return tuple(state.maze_player_pos)
+
+def draw_maze_puzzle(state, surface):
+    """Draw the maze puzzle interface."""
+    if not state.maze_visible:
+        return
+    return maze_panel.draw(state, surface, _maze_puzzle_inputs(state))
+
+def blacksmith_shop_layout(state):
+    """Shop button rects for hit-testing, without drawing anything."""
+    return blacksmith_panel.refresh(state, _blacksmith_shop_inputs(state))
+
+def safe_puzzle_layout(state):
+    """Keypad button rects for hit-testing, without drawing anything."""
+    return safe_panel.refresh(state, _safe_puzzle_inputs(state))
+
+def maze_puzzle_layout(state):
+    """Maze close button rect for hit-testing, without drawing anything."""
+    return maze_panel.refresh(state, _maze_puzzle_inputs(state))
+
+def handle_maze_input(state):
     """Handle arrow key input for maze navigation."""
-    global maze_player_pos, maze_completed
     
     keys = pygame.key.get_pressed()
-    new_pos = maze_player_pos.copy()
+    new_pos = state.maze_player_pos.copy()
     
     if keys[pygame.K_UP]:
         new_pos[1] -= 1
@@ -1820,30 +3119,37 @@ def handle_maze_input():
     # Check if move is valid (within bounds and not a wall)
     if (0 <= new_pos[0] < maze_width and 0 <= new_pos[1] < maze_height and 
         maze_layout[new_pos[1]][new_pos[0]] == 0):
-        maze_player_pos = new_pos
+        state.maze_player_pos = new_pos
         
         # Check if reached exit
-        if maze_player_pos == maze_exit_pos:
-            maze_completed = True
-            maze_visible = False
+        if state.maze_player_pos == maze_exit_pos:
+            state.maze_completed = True
+            state.maze_visible = False
            
-            room_key = tuple(current_room)
-            room_info = room_data.get(room_key, {})
-            for npc in room_info.get("npcs", []):
-                if npc.get("id") == "knight":
-                    npc["rescued"] = True
-                    npc["x"] = 500  
-                    npc["y"] = 450
-                    quests["rescue_knight"]["complete"] = True
-                    quests["defeat_goblin_king"]["active"] = True
-                    # Drop a key near the cage
-                    room_info["items"].append({"type": "key", "x": 450, "y": 500, "id": "key_0_1_0_2"})
-                    set_message("Knight rescued! He dropped a key!", (0, 255, 0), 3.0)
-                    break
+            # the knight steps out and drops a key; the room's rescued variant already has both
+            if tuple(state.current_room) == KNIGHT_ROOM:
+                state.knight_rescued = True
+                publish(state, "rescue", "knight")
+                set_message(state, "Knight rescued! He dropped a key!", (0, 255, 0), 3.0)
         return True
     return False
 
 # ===== NEW UI FUNCTIONS =====
+MENU_BUTTON_WIDTH, MENU_BUTTON_HEIGHT = 300, 60
+
+def main_menu_layout():
+    """Rects of the PLAY, HOW TO PLAY and ABOUT buttons, for drawing and hit-testing."""
+    button_x = ROOM_WIDTH//2 - MENU_BUTTON_WIDTH//2
+    return (
+        pygame.Rect(button_x, 300, MENU_BUTTON_WIDTH, MENU_BUTTON_HEIGHT),
+        pygame.Rect(button_x, 380, MENU_BUTTON_WIDTH, MENU_BUTTON_HEIGHT),
+        pygame.Rect(button_x, 460, MENU_BUTTON_WIDTH, MENU_BUTTON_HEIGHT),
+    )
+
+def back_button_layout():
+    """Rect of the BACK button shared by the how to play and about screens."""
+    return pygame.Rect(ROOM_WIDTH//2 - 100, ROOM_HEIGHT - 80, 200, 50)
+
 def create_button(text, x, y, width, height, hover=False):
     """Create a button with hover effect."""
     button_color = (80, 80, 120) if not hover else (100, 100, 150)
@@ -1853,42 +3159,40 @@ def create_button(text, x, y, width, height, hover=False):
     pygame.draw.rect(screen, button_color, button_rect)
     pygame.draw.rect(screen, border_color, button_rect, 3)
     
-    text_surf = button_font.render(text, True, (255, 255, 255))
+    text_surf = render_text(button_font, text, (255, 255, 255))
     text_rect = text_surf.get_rect(center=button_rect.center)
     screen.blit(text_surf, text_rect)
     
     return button_rect
 
-def draw_main_menu():
+def draw_main_menu(state):
     """Draw the main menu with options."""
+    invalidate_screen()
     screen.fill((20, 20, 40))
     
     # Title
-    title = title_font.render("CHRONICLES OF TIME", True, (255, 215, 0))
-    subtitle = font.render("An Epic Time-Travel Adventure", True, (200, 200, 255))
+    title = render_text(title_font, "CHRONICLES OF TIME", (255, 215, 0))
+    subtitle = render_text(font, "An Epic Time-Travel Adventure", (200, 200, 255))
     screen.blit(title, (ROOM_WIDTH//2 - title.get_width()//2, 150))
     screen.blit(subtitle, (ROOM_WIDTH//2 - subtitle.get_width()//2, 220))
     
     # Buttons
-    button_width, button_height = 300, 60
-    button_x = ROOM_WIDTH//2 - button_width//2
-    
-    play_button = create_button("PLAY", button_x, 300, button_width, button_height, play_button_hover)
-    how_to_button = create_button("HOW TO PLAY", button_x, 380, button_width, button_height, how_to_button_hover)
-    about_button = create_button("ABOUT", button_x, 460, button_width, button_height, about_button_hover)
+    play_rect, how_to_rect, about_rect = main_menu_layout()
+    create_button("PLAY", *play_rect, state.play_button_hover)
+    create_button("HOW TO PLAY", *how_to_rect, state.how_to_button_hover)
+    create_button("ABOUT", *about_rect, state.about_button_hover)
     
     # Footer
-    footer = small_font.render("Made by Arjun Tambe, Shuban Nannisetty and Charanjit Kukkadapu.", True, (150, 150, 150))
+    footer = render_text(small_font, "Made by Arjun Tambe, Shuban Nannisetty and Charanjit Kukkadapu.", (150, 150, 150))
     screen.blit(footer, (ROOM_WIDTH//2 - footer.get_width()//2, ROOM_HEIGHT - 40))
-    
-    return play_button, how_to_button, about_button
 
-def draw_how_to_play():
+def draw_how_to_play(state):
     """Draw the how to play screen."""
+    invalidate_screen()
     screen.fill((20, 20, 40))
     
     # Title
-    title = title_font.render("HOW TO PLAY", True, (255, 215, 0))
+    title = render_text(title_font, "HOW TO PLAY", (255, 215, 0))
     screen.blit(title, (ROOM_WIDTH//2 - title.get_width()//2, 80))
     
     # Content box
@@ -1922,22 +3226,22 @@ def draw_how_to_play():
     y = content_box.y + 20
     for line in instructions:
         if "CONTROLS:" in line or "GAMEPLAY:" in line:
-            text = font.render(line, True, (255, 180, 0))
+            text = render_text(font, line, (255, 180, 0))
         else:
-            text = small_font.render(line, True, (220, 220, 220))
+            text = render_text(small_font, line, (220, 220, 220))
         screen.blit(text, (content_box.x + 20, y))
         y += 30
     
     # Back button
-    back_button = create_button("BACK", ROOM_WIDTH//2 - 100, ROOM_HEIGHT - 80, 200, 50, back_button_hover)
-    return back_button
+    create_button("BACK", *back_button_layout(), state.back_button_hover)
 
-def draw_about():
+def draw_about(state):
     """Draw the about screen."""
+    invalidate_screen()
     screen.fill((20, 20, 40))
     
     # Title
-    title = title_font.render("ABOUT", True, (255, 215, 0))
+    title = render_text(title_font, "ABOUT", (255, 215, 0))
     screen.blit(title, (ROOM_WIDTH//2 - title.get_width()//2, 80))
     
     # Content box
@@ -1972,618 +3276,664 @@ def draw_about():
     y = content_box.y + 20
     for line in about_text:
         if "CHRONICLES OF TIME" in line:
-            text = font.render(line, True, (255, 180, 0))
+            text = render_text(font, line, (255, 180, 0))
         elif "STORY:" in line or "FEATURES:" in line:
-            text = small_font.render(line, True, (200, 200, 255))
+            text = render_text(small_font, line, (200, 200, 255))
         else:
-            text = small_font.render(line, True, (220, 220, 220))
+            text = render_text(small_font, line, (220, 220, 220))
         screen.blit(text, (content_box.x + 20, y))
         y += 25
     
     # Back button
-    back_button = create_button("BACK", ROOM_WIDTH//2 - 100, ROOM_HEIGHT - 80, 200, 50, back_button_hover)
-    return back_button
+    create_button("BACK", *back_button_layout(), state.back_button_hover)
 
 #  GAME LOGIC FUNCTIONS 
-def collision_check(dx, dy):
+def collision_check(state, dx, dy):
     """Handle collision with objects."""
+    player = state.player
+    # the rect moves in whole pixels, the remainder carries the fraction to the next tick
+    state.player_remainder[0] += dx
+    dx = int(state.player_remainder[0])
+    state.player_remainder[0] -= dx
+    
+    # only the colliders under each swept axis move can be hit
+    nearby = state.active_room.collision.query(player.union(player.move(dx, 0)))
     player.x += dx
-    for collider in colliders:
+    for collider in nearby:
         if player.colliderect(collider):
+            state.player_remainder[0] = 0.0
             if dx > 0:
                 player.right = collider.left
             elif dx < 0:
                 player.left = collider.right
     
+    state.player_remainder[1] += dy
+    dy = int(state.player_remainder[1])
+    state.player_remainder[1] -= dy
+    
+    nearby = state.active_room.collision.query(player.union(player.move(0, dy)))
     player.y += dy
-    for collider in colliders:
+    for collider in nearby:
         if player.colliderect(collider):
+            state.player_remainder[1] = 0.0
             if dy > 0:
                 player.bottom = collider.top
             elif dy < 0:
                 player.top = collider.bottom
 
-def room_transition():
+def room_transition(state):
     """Handle moving between rooms."""
-    level, row, col = current_room
+    player = state.player
+    level, row, col = state.current_room
     
     if player.right > ROOM_WIDTH:
         if col < GRID_WIDTH - 1:
-            current_room[2] += 1
+            state.current_room[2] += 1
             player.left = 0
         else:
             player.right = ROOM_WIDTH
     
     elif player.top < 0:
         if row < GRID_HEIGHT - 1:
-            current_room[1] += 1
+            state.current_room[1] += 1
             player.bottom = ROOM_HEIGHT
         else:
             player.top = 0
     
     elif player.bottom > ROOM_HEIGHT:
         if row > 0:
-            current_room[1] -= 1
+            state.current_room[1] -= 1
             player.top = 0
         else:
             player.bottom = ROOM_HEIGHT
     elif player.left < 0:
         if col > 0:
             # ------ Market → Rooftop  ONLY ------
-            if current_room[0] == 1 and current_room[1] == 0 and current_room[2] == 1:  # still IN market
-                current_room[2] = 0          
+            if state.current_room[0] == 1 and state.current_room[1] == 0 and state.current_room[2] == 1:  # still IN market
+                state.current_room[2] = 0          
                 player.center = (625, 450)  # spawn point when entering Rooftop from Market
                 return                      
-            current_room[2] -= 1
+            state.current_room[2] -= 1
             player.right = ROOM_WIDTH
         else:
             player.left = 0
 
-def update_goblins(dt):
+def update_goblins(state, dt):
     """Move goblins toward the player in the Forest Path."""
-    room_key = tuple(current_room)
-    state = goblin_rooms.get(room_key)
-    if not state:
+    player = state.player
+    room_key = tuple(state.current_room)
+    goblins = state.goblin_rooms.get(room_key)
+    if not goblins:
         return
-    if dialogue_active or hud_visible or quest_log_visible or upgrade_shop_visible or maze_visible:
+    if state.dialogue_active or state.hud_visible or state.quest_log_visible or state.upgrade_shop_visible or state.maze_visible:
         return
-    global goblin_contact_cooldown, health
 
     dt_sec = dt / 1000.0
-    goblin_contact_cooldown = max(0.0, goblin_contact_cooldown - dt_sec)
+    state.goblin_contact_cooldown = max(0.0, state.goblin_contact_cooldown - dt_sec)
 
     # Spawn next wave when current is cleared
-    if not any(g.get("alive", True) for g in state["active"]):
-        if state["wave_index"] < len(state["waves"]):
-            state["respawn"] -= dt_sec
-            if state["respawn"] <= 0:
-                spawn = state["waves"][state["wave_index"]]
-                state["active"] = [{"x": float(x), "y": float(y), "alive": True, "loot_given": False} for x, y in spawn]
-                state["wave_index"] += 1
-                state["respawn"] = 1.0  # prepare next delay
-                set_message("Goblins incoming!", (255, 180, 50), 1.0)
+    swarm = goblins["swarm"]
+    if not swarm.count:
+        if goblins["wave_index"] < len(goblins["waves"]):
+            goblins["respawn"] -= dt_sec
+            if goblins["respawn"] <= 0:
+                swarm.spawn_wave(goblins["waves"][goblins["wave_index"]])
+                goblins["wave_index"] += 1
+                goblins["respawn"] = 1.0  # prepare next delay
+                set_message(state, "Goblins incoming!", (255, 180, 50), 1.0)
         return
 
-    # Chase the player
-    w, h = get_npc_size("goblin")
+    # Once spotted, chase the player around the room's obstacles, keeping some elbow room so a wave doesn't collapse into one sprite
     speed = 140  
-    for goblin in state["active"]:
-        if not goblin.get("alive", True):
-            continue
-        gx = goblin["x"] + w / 2
-        gy = goblin["y"] + h / 2
-        dx = player.centerx - gx
-        dy = player.centery - gy
-        dist = math.hypot(dx, dy)
-        if dist <= 1:
-            continue
-        step = speed * dt_sec
-        goblin["x"] += (dx / dist) * step
-        goblin["y"] += (dy / dist) * step
-        goblin["x"] = max(0, min(ROOM_WIDTH - w, goblin["x"]))
-        goblin["y"] = max(0, min(ROOM_HEIGHT - h, goblin["y"]))
-
-        # Contact damage
-        goblin_rect = pygame.Rect(goblin["x"], goblin["y"], w, h)
-        if goblin_rect.colliderect(player) and goblin_contact_cooldown <= 0:
-            health = max(0, health - GOBLIN_CONTACT_DAMAGE)
-            goblin_contact_cooldown = 0.75
-            set_message(f"-{GOBLIN_CONTACT_DAMAGE} HP (Goblin)", (255, 80, 80), 1.0)
-
-def pickup_items():
+    size = get_npc_size("goblin")
+    room = get_room(room_key, state.knight_rescued)
+    if room.flow is None:
+        room.flow = FlowField(room.colliders, size)
+    room.flow.update(player.center)
+    swarm.spot(room.sight, player.center, size)
+    push = swarm.separation(size, GOBLIN_SEPARATION_SPEED * dt_sec)
+    touching = swarm.step(player, speed * dt_sec, size, push, room.flow)
+
+    # Contact damage
+    if touching.any() and state.goblin_contact_cooldown <= 0:
+        state.health = max(0, state.health - GOBLIN_CONTACT_DAMAGE)
+        state.goblin_contact_cooldown = 0.75
+        set_message(state, f"-{GOBLIN_CONTACT_DAMAGE} HP (Goblin)", (255, 80, 80), 1.0)
+
+ITEM_PICKUPS = {   # item type -> (inventory slot, amount, message, colour, seconds)
+    "gold": ("Gold", 10, "+10 Gold", (255, 215, 0), 1.5),
+    "herb": ("Herbs", 1, "+1 Herb", (0, 255, 0), 1.5),
+    "potion": ("Health Potions", 1, "+1 Health Potion", (255, 0, 0), 1.5),
+    "key": ("Keys", 1, "+1 Key", (255, 215, 0), 1.5),
+    "timeshard": ("Time Shards", 1, "+1 Time Shard!", (150, 150, 255), 2.0),
+}
+
+def pickup_items(state):
     """Handle item collection."""
-    global message, message_timer, message_color, health, player_speed_boost_timer
-    
-    for rect, x, y in gold_items:
-        if player.colliderect(rect):
-            inventory["Gold"] += 10
-            collected_gold.add((*current_room, x, y))
-            set_message("+10 Gold", (255, 215, 0), 1.5)
-    
-    for rect, x, y in herbs:
-        if player.colliderect(rect):
-            inventory["Herbs"] += 1
-            collected_herbs.add((*current_room, x, y))
-            set_message("+1 Herb", (0, 255, 0), 1.5)
-    
-    for rect, x, y in potions:
-        if player.colliderect(rect):
-            inventory["Health Potions"] += 1
-            collected_potions.add((*current_room, x, y))
-
-
-            if tuple(current_room) == (0, 1, 2):
-                global health, player_speed_boost_timer
-                player_speed_boost_timer = 8.0
-                health = min(max_health, health + 30)
-                set_message("+1 Health Potion (Boost active!)", (0, 255, 0), 1.8)
-            else:
-                set_message("+1 Health Potion", (255, 0, 0), 1.5)
     
-    # Handle key and time shard pickup
-    room_key = tuple(current_room)
-    room_info = room_data.get(room_key, {})
-    for item in room_info.get("items", []):
-        if item["type"] in ["key", "timeshard"]:
-            # Create appropriate sized collision rectangle
-            if item["type"] == "key":
-                item_rect = pygame.Rect(item["x"], item["y"], 45, 45)
-            elif item["type"] == "timeshard":
-                item_rect = pygame.Rect(item["x"], item["y"], 50, 50)
-            else:
-                item_rect = pygame.Rect(item["x"], item["y"], 25, 25)
-                
-            if player.colliderect(item_rect.inflate(20, 20)) and (room_key[0], room_key[1], room_key[2], item["x"], item["y"]) not in collected_keys and item["type"] == "key":
-                inventory["Keys"] += 1
-                collected_keys.add((room_key[0], room_key[1], room_key[2], item["x"], item["y"]))
-                set_message("+1 Key", (255, 215, 0), 1.5)
-                break
-            elif player.colliderect(item_rect.inflate(20, 20)) and (room_key[0], room_key[1], room_key[2], item["x"], item["y"]) not in collected_timeshards and item["type"] == "timeshard":
-                inventory["Time Shards"] += 1
-                collected_timeshards.add((room_key[0], room_key[1], room_key[2], item["x"], item["y"]))
-                set_message("+1 Time Shard!", (150, 150, 255), 2.0)
-                break
+    room = state.active_room
+    items, rects = room.uncollected(collected_mask(state, room.key))
+    for index in state.player.collidelistall(rects):
+        item = items[index]
+        if item.type not in ITEM_PICKUPS:
+            continue
+        slot, amount, text, color, duration = ITEM_PICKUPS[item.type]
+        state.inventory[slot] += amount
+        collect_item(state, room.key, item)
+        
+        if item.type == "potion" and room.key == (0, 1, 2):
+            state.player_speed_boost_timer = 8.0
+            state.health = min(state.max_health, state.health + 30)
+            set_message(state, "+1 Health Potion (Boost active!)", (0, 255, 0), 1.8)
+        else:
+            set_message(state, text, color, duration)
+        publish(state, "pickup", item.type)
 
-def set_message(text, color, duration):
+def set_message(state, text, color, duration):
     """Helper to queue on-screen messages safely."""
-    global message, message_timer, message_color
-    message, message_color, message_timer = text, color, duration
+    state.message, state.message_color, state.message_timer = text, color, duration
+
+#  interactions
+def _herb_gift_state(state, room, npc):
+    if state.inventory["Herbs"] >= 3 and not state.quests["collect_herbs"]["complete"]:
+        return "ready"
+    return "short" if state.inventory["Herbs"] < 3 else "given"
+
+def _cage_state(state, room, obj):
+    return "open" if state.knight_rescued else "locked"
+
+# (verb, target) -> function(room, target object) giving the state INTERACTIONS are keyed on
+INTERACTION_STATES = {
+    ("use", "elder"): lambda state, room, npc: "done" if state.quests["talk_to_elder"]["complete"] else "new",
+    ("use", "cage"): _cage_state,
+    ("use", "lever"): lambda state, room, obj: "down" if state.quests["solve_drawbridge"]["complete"] else "up",
+    ("use", "safe"): lambda state, room, obj: "unlocked" if state.safe_unlocked else "locked",
+    ("use", "portal"): lambda state, room, obj: "charged" if state.inventory["Keys"] >= PORTAL_KEYS else "uncharged",
+    ("give", "herbcollector"): _herb_gift_state,
+}
 
-def handle_interaction():
-    """Handle F key interactions."""
-    global dialogue_active, current_dialogue, dialogue_index, upgrade_shop_visible
-    global safe_visible, safe_input, safe_unlocked, maze_visible
-    
-    room_key = tuple(current_room)
-    
-    # Check for Blacksmith anvil
-    if room_key == (0, 0, 1):
-        for inter_obj in interactive_objects:
-            if inter_obj["type"] == "anvil" and player.colliderect(inter_obj["rect"].inflate(50, 50)):
-                upgrade_shop_visible = True
-                return
-    
-    # Check for NPCs
-    for npc_rect in npcs:
-        if player.colliderect(npc_rect.inflate(50, 50)):
-            for npc in room_data.get(room_key, {}).get("npcs", []):
-                npc_size = get_npc_size(npc["id"])
-                npc_rect_check = pygame.Rect(npc["x"], npc["y"], npc_size[0], npc_size[1])
-                if npc_rect_check.colliderect(npc_rect):
-                   
-                    if npc["id"] == "knight":
-                        if npc.get("rescued", False):
-                            dialogue_key = (room_key[0], room_key[1], room_key[2], "knight_rescued")
-                        else:
-                            dialogue_key = (room_key[0], room_key[1], room_key[2], "knight")
-                        
-                        if dialogue_key in npc_dialogues:
-                            current_dialogue = npc_dialogues[dialogue_key]
-                            dialogue_active = True
-                            dialogue_index = 0
-                            
-                           
-                            if npc.get("rescued", False) and not quests["rescue_knight"]["complete"]:
-                                quests["rescue_knight"]["complete"] = True
-                                quests["defeat_goblin_king"]["active"] = True
-                                set_message("Knight Rescued!", (0, 255, 0), 2.0)
-                    else:
-                        # Other NPCs use normal dialogue
-                        dialogue_key = (room_key[0], room_key[1], room_key[2], npc["id"])
-                        if dialogue_key in npc_dialogues:
-                            current_dialogue = npc_dialogues[dialogue_key]
-                            dialogue_active = True
-                            dialogue_index = 0
-                            
-                            # Quest completion for elder
-                            if npc["id"] == "elder" and not quests["talk_to_elder"]["complete"]:
-                                quests["talk_to_elder"]["complete"] = True
-                                quests["buy_weapon"]["active"] = True
-                                set_message("Quest Updated! Visit the blacksmith.", (0, 255, 0), 2.0)
-                    return
-
-
-    for inter_obj in interactive_objects:
-        if player.colliderect(inter_obj["rect"].inflate(50, 50)):
-            obj_type = inter_obj["type"]
-            
-            if obj_type == "cage" and room_key == (0, 1, 0):
-
-                room_info = room_data.get(room_key, {})
-                knight_rescued = False
-                for npc in room_info.get("npcs", []):
-                    if npc.get("id") == "knight":
-                        knight_rescued = npc.get("rescued", False)
-                        break
-                
-                if not knight_rescued:
-                    # Start maze puzzle to rescue knight
-                    maze_visible = True
-                    maze_player_pos = [1, 1]  # Reset player position
-                    maze_completed = False
-                    set_message("Solve the maze to free the knight!", (0, 255, 0), 2.0)
-                else:
-                    set_message("The knight has already been rescued!", (200, 200, 200), 1.5)
-            
-            elif obj_type == "lever" and room_key == (0, 1, 1):
-                if not quests["solve_drawbridge"]["complete"]:
-                    quests["solve_drawbridge"]["complete"] = True
-                    set_message("Drawbridge Lowered!", (0, 255, 0), 2.0)
-            
-            elif obj_type == "safe" and room_key == (0, 2, 1):
-                if not safe_unlocked:
-                    safe_visible = True
-                    safe_input = ""
-                else:
-                    set_message("The safe is already unlocked.", (200, 200, 200), 1.5)
-            
-            elif obj_type == "portal" and room_key == (0, 2, 2):
-                if inventory["Keys"] >= 2:
-                    enter_level_2()
-                else:
-                    need = 2 - inventory["Keys"]
-                    set_message(f"You need {need} more key(s) to activate the portal!", (255, 200, 0), 2.0)
+def _show_dialogue(state, lines):
+    state.current_dialogue = lines
+    state.dialogue_active = True
+    state.dialogue_index = 0
+
+def _open_shop(state):
+    state.upgrade_shop_visible = True
+
+def _open_safe(state):
+    state.safe_visible = True
+    state.safe_input = ""
+
+def _start_maze(state):
+    # opening the cage always starts the maze over
+    state.maze_player_pos = [1, 1]
+    state.maze_completed = False
+    state.maze_visible = True
+
+def _need_keys(state, count):
+    need = count - state.inventory["Keys"]
+    set_message(state, f"You need {need} more key(s) to activate the portal!", (255, 200, 0), 2.0)
+
+def _take(state, slot, amount):
+    state.inventory[slot] -= amount
+
+INTERACTION_EFFECTS = {
+    "dialogue": _show_dialogue,   # compiled from a variant name to its lines
+    "event": publish,
+    "message": set_message,
+    "open_shop": _open_shop,
+    "open_safe": _open_safe,
+    "start_maze": _start_maze,
+    "enter_level_2": enter_level_2,
+    "need_keys": _need_keys,
+    "take": _take,
+}
 
+def compile_interactions():
+    """Build verb -> {(room, target, state): [(effect, args), ...]} from INTERACTIONS."""
+    tables = {}
+    for verb, room_key, target, target_state, effects in INTERACTIONS:
+        steps = []
+        for name, *args in effects:
+            if name == "dialogue":
+                args = [npc_dialogues[(room_key, target, args[0])]]
+            steps.append((INTERACTION_EFFECTS[name], args))
+        tables.setdefault(verb, {})[(room_key, target, target_state)] = steps
+    return tables
+
+interaction_tables = compile_interactions()
+
+def interact(state, verb, trigger):
+    """Run whatever INTERACTIONS says verb does to trigger's target in its current state."""
+    room = get_room(state.current_room, state.knight_rescued)
+    target = trigger.target.id if trigger.type == "npc" else trigger.type
+    resolve = INTERACTION_STATES.get((verb, target))
+    target_state = resolve(state, room, trigger.target) if resolve else "default"
+    for effect, args in interaction_tables[verb].get((room.key, target, target_state), ()):
+        effect(state, *args)
+
+def handle_interaction(state):
+    """Handle F key interactions."""
+    trigger = nearest_trigger(state)
+    if trigger is not None:
+        interact(state, "use", trigger)
 
-def give_herbs_to_collector():
+def give_herbs_to_collector(state):
     """Handle G key to give herbs to the herb collector."""
-    global dialogue_active, current_dialogue, dialogue_index
-    
-    room_key = tuple(current_room)
-    if room_key != (0, 2, 1):  # Only in library
-        return
-    
-    # Check if near herb collector
-    for npc_rect in npcs:
-        if player.colliderect(npc_rect.inflate(50, 50)):
-            for npc in room_data.get(room_key, {}).get("npcs", []):
-                if npc["id"] == "herbcollector":
-                    if inventory["Herbs"] >= 3 and not quests["collect_herbs"]["complete"]:
-                        # Give herbs to collector
-                        inventory["Herbs"] -= 3
-                        quests["collect_herbs"]["complete"] = True
-                        
-                        # Show special dialogue with code
-                        current_dialogue = npc_dialogues[(0, 2, 1, "herbcollector_with_herbs")]
-                        dialogue_active = True
-                        dialogue_index = 0
-                        
-                        set_message("You gave 3 herbs to the collector!", (0, 255, 0), 2.0)
-                    elif inventory["Herbs"] < 3:
-                        set_message("You need 3 herbs to give to the collector!", (255, 200, 0), 1.5)
-                    else:
-                        set_message("You already gave herbs to the collector.", (200, 200, 200), 1.5)
-                    return
-
-def handle_safe_input(number):
+    trigger = nearest_trigger(state, "herbcollector")
+    if trigger is not None:
+        interact(state, "give", trigger)
+
+def handle_safe_input(state, number):
     """Handle number input for the safe puzzle."""
-    global safe_input, safe_unlocked
     
-    if len(safe_input) < 4:
-        safe_input += number
+    if len(state.safe_input) < 4:
+        state.safe_input += number
         
-        if len(safe_input) == 4:
-            if safe_input == safe_code:
-                safe_unlocked = True
-                inventory["Keys"] += 1
-                set_message("Safe unlocked! You found a key!", (0, 255, 0), 2.0)
+        if len(state.safe_input) == 4:
+            if state.safe_input == safe_code:
+                state.safe_unlocked = True
+                invalidate_static_layer(state.current_room)
+                state.inventory["Keys"] += 1
+                set_message(state, "Safe unlocked! You found a key!", (0, 255, 0), 2.0)
             else:
-                safe_input = ""
-                set_message("Wrong code! Try again.", (255, 0, 0), 1.5)
-
-#  MAIN GAME LOOP 
-running = True
-play_button_hover = False
-how_to_button_hover = False
-about_button_hover = False
-back_button_hover = False
-
+                state.safe_input = ""
+                set_message(state, "Wrong code! Try again.", (255, 0, 0), 1.5)
+
+if COOK_ASSETS:
+    count = cook_asset_pack(cooked_asset_requests())
+    print(f"Cooked {count} assets into {COOKED_PACK_PATH}")
+    pygame.quit()
+    sys.exit()
+
+#  idle-aware frame pacing
+IDLE_WAIT_MS = 500   # longest the loop sleeps between wake-ups while nothing can change
+STATIC_SCREENS = ["main_menu", "how_to_play", "about"]
+
+def coalesce_mouse_motion(events):
+    """Drop all but the newest MOUSEMOTION so a flood of motion costs one hover check."""
+    last_motion = None
+    for event in events:
+        if event.type == pygame.MOUSEMOTION:
+            last_motion = event
+    return [event for event in events if event.type != pygame.MOUSEMOTION or event is last_motion]
+
+def wait_for_input(timeout):
+    """Block until input arrives (or the timeout passes) and return the pending events."""
+    first = pygame.event.wait(timeout)
+    events = pygame.event.get()
+    if first.type != pygame.NOEVENT:
+        events.insert(0, first)
+    return coalesce_mouse_motion(events)
+
+def world_is_idle(state):
+    """True when a paused overlay is up and nothing in the room can move or tick."""
+    if not (state.dialogue_active or state.upgrade_shop_visible or state.quest_log_visible or state.hud_visible or state.maze_visible):
+        return False
+    if tuple(state.current_room) == (0, 2, 0) and state.boss and state.boss.alive:
+        return False   # the boss keeps fighting behind overlays
+    # only bullets fly everywhere; axes only move while the boss above is fighting
+    if len(state.projectiles.owned_by(OWNER_PLAYER)) or state.message_timer > 0 or state.is_reloading or state.shoot_cooldown > 0:
+        return False
+    if state.player_speed_boost_timer > 0 or any(state.player.colliderect(zone) for zone in state.active_room.damage_zones):
+        return False
+    return True
 
-boss_initialized = False
+def screen_is_idle(state):
+    """True when the next frame would look the same unless the player does something."""
+    if state.mode in STATIC_SCREENS:
+        return True
+    return state.mode == "playing" and world_is_idle(state)
+
+#  fixed-timestep simulation
+SIM_HZ = 120   # gameplay ticks per second, independent of the render rate
+SIM_TICK_MS = 1000.0 / SIM_HZ
+MAX_FRAME_MS = 250   # after a stall, drop time instead of running a burst of catch-up ticks
+
+def lerp(a, b, t):
+    return a + (b - a) * t
+
+def player_float_pos(state):
+    return (state.player.x + state.player_remainder[0], state.player.y + state.player_remainder[1])
+
+def snap_interpolation(state):
+    """Forget the player's previous tick position after a teleport or room change."""
+    state.player_prev = player_float_pos(state)
+
+def interpolated_player_rect(state):
+    """The player's rect as it should be drawn this frame."""
+    x, y = player_float_pos(state)
+    return pygame.Rect(round(lerp(state.player_prev[0], x, state.render_alpha)), round(lerp(state.player_prev[1], y, state.render_alpha)), state.player.width, state.player.height)
+
+def store_previous_positions(state):
+    """Remember where everything was at the start of the tick."""
+    boss = state.boss
+    state.player_prev = player_float_pos(state)
+    state.projectiles.store_previous()
+    goblins = state.goblin_rooms.get(state.active_room.key)
+    if goblins:
+        goblins["swarm"].store_previous()
+    if boss:
+        boss.prev = tuple(boss.pos)
+        boss.axe_prev_angle = boss.axe_angle
+
+def simulate_tick(state, mv_x, mv_y):
+    """Advance gameplay by one fixed tick."""
+    dt = SIM_TICK_MS
+    dt_sec = dt / 1000.0
+    state.active_room = get_room(state.current_room, state.knight_rescued)
+    store_previous_positions(state)
+    
+    state.player_speed_boost_timer = max(0.0, state.player_speed_boost_timer - dt_sec)
+    speed = player_speed + (PLAYER_BOOST_SPEED if state.player_speed_boost_timer > 0 else 0)
+    
+    update_goblins(state, dt)
+    if state.active_room.key == (0, 2, 0) and state.boss and state.boss.alive:
+        update_boss(state, dt)
+    
+    # Movement & collision
+    collision_check(state, mv_x * speed * dt_sec, mv_y * speed * dt_sec)
+    room_transition(state)
+    if tuple(state.current_room) != state.active_room.key:
+        snap_interpolation(state)
+    update_triggers(state, get_room(state.current_room, state.knight_rescued))
+    
+    handle_damage_zones(state, dt)
+    if state.health <= 0:
+        respawn_player(state)
+    
+    if tuple(state.current_room) == (0, 2, 0) and state.boss_defeated and not state.boss_drop_collected:
+        collect_boss_drops(state)
+    
+    # Update weapon systems
+    if state.shoot_cooldown > 0:
+        state.shoot_cooldown = max(0, state.shoot_cooldown - dt_sec)
+    
+    if state.is_reloading:
+        state.reload_time -= dt_sec
+        if state.reload_time <= 0:
+            state.ammo = max_ammo
+            state.is_reloading = False
+            state.reload_time = 0.0
+    
+    update_bullets(state, dt)
+    pickup_items(state)
+    
+    if state.message_timer > 0:
+        state.message_timer = max(0, state.message_timer - dt_sec)
+
+def run_simulation(state, frame_ms, mv_x, mv_y):
+    """Run as many fixed ticks as the elapsed frame time covers, carrying the rest over."""
+    if tuple(state.current_room) == (0, 2, 0) and not state.boss_initialized:
+        init_boss(state)
+        state.boss_initialized = True
+    state.sim_accumulator += min(frame_ms, MAX_FRAME_MS)
+    while state.sim_accumulator >= SIM_TICK_MS:
+        simulate_tick(state, mv_x, mv_y)
+        state.sim_accumulator -= SIM_TICK_MS
+    state.render_alpha = state.sim_accumulator / SIM_TICK_MS
 
-# main loop listens for input updates game state and draws world
-while running:
-    dt = clock.tick(60)
-    keys_pressed = pygame.key.get_pressed()
-    mouse_pos = pygame.mouse.get_pos()
-    
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        
-        elif event.type == pygame.MOUSEMOTION:
-            # handle hover states so menus and puzzles feel responsive
-            if game_state == "main_menu":
-                play_button, how_to_button, about_button = draw_main_menu()
-                play_button_hover = play_button.collidepoint(mouse_pos)
-                how_to_button_hover = how_to_button.collidepoint(mouse_pos)
-                about_button_hover = about_button.collidepoint(mouse_pos)
-            elif game_state in ["how_to_play", "about"]:
-                back_button = draw_how_to_play() if game_state == "how_to_play" else draw_about()
-                back_button_hover = back_button.collidepoint(mouse_pos)
-            elif game_state == "playing" and safe_visible:
-                buttons, clear_rect, close_rect = draw_safe_puzzle(screen)
-            elif game_state == "playing" and maze_visible:
-                close_rect = draw_maze_puzzle(screen)
-        
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            if game_state == "main_menu":
-                play_button, how_to_button, about_button = draw_main_menu()
-                if play_button.collidepoint(mouse_pos):
-                    game_state = "playing"
-                elif how_to_button.collidepoint(mouse_pos):
-                    game_state = "how_to_play"
-                elif about_button.collidepoint(mouse_pos):
-                    game_state = "about"
-            
-            elif game_state in ["how_to_play", "about"]:
-                back_button = draw_how_to_play() if game_state == "how_to_play" else draw_about()
-                if back_button.collidepoint(mouse_pos):
-                    game_state = "main_menu"
+#  MAIN GAME LOOP 
+def main():
+    """Open a session and run the game until the window is closed."""
+    state = GameState()
+    running = True
+    redraw_requested = True   # draw at least once before the loop is allowed to idle
+    
+    pin_room_assets(*state.current_room)
+    prefetch_adjacent_rooms(*state.current_room)
+    
+    # main loop listens for input updates game state and draws world
+    while running:
+        if screen_is_idle(state) and not redraw_requested:
+            # nothing can change on its own, so sleep until input instead of ticking at 60 FPS
+            events = wait_for_input(IDLE_WAIT_MS)
+            clock.tick()   # time spent asleep is not simulated
+            dt = 0
+        else:
+            dt = clock.tick(60)
+            events = coalesce_mouse_motion(pygame.event.get())
+        keys_pressed = pygame.key.get_pressed()
+        mouse_pos = pygame.mouse.get_pos()
+        redraw_requested = not screen_is_idle(state)
+        
+        for event in events:
+            if event.type != pygame.MOUSEMOTION:
+                redraw_requested = True
             
-            elif game_state == "playing" and upgrade_shop_visible:
-                item_buttons, close_rect = draw_blacksmith_shop(screen)
-                
-                for button_rect, item_id in item_buttons:
-                    if button_rect.collidepoint(mouse_pos):
-                        handle_blacksmith_purchase(item_id)
-                
-                if close_rect.collidepoint(mouse_pos):
-                    upgrade_shop_visible = False
+            if event.type == pygame.QUIT:
+                running = False
             
-            elif game_state == "playing" and safe_visible:
-                buttons, clear_rect, close_rect = draw_safe_puzzle(screen)
-                
-                # Check number buttons
-                for button_rect, number in buttons:
-                    if button_rect.collidepoint(mouse_pos):
-                        handle_safe_input(number)
-                
-                # Check clear button
-                if clear_rect.collidepoint(mouse_pos):
-                    safe_input = ""
-                
-                # Check close button
-                if close_rect.collidepoint(mouse_pos):
-                    safe_visible = False
+            elif event.type == pygame.MOUSEMOTION:
+                # handle hover states so menus and puzzles feel responsive
+                hovers = (state.play_button_hover, state.how_to_button_hover, state.about_button_hover, state.back_button_hover)
+                if state.mode == "main_menu":
+                    play_button, how_to_button, about_button = main_menu_layout()
+                    state.play_button_hover = play_button.collidepoint(mouse_pos)
+                    state.how_to_button_hover = how_to_button.collidepoint(mouse_pos)
+                    state.about_button_hover = about_button.collidepoint(mouse_pos)
+                elif state.mode in ["how_to_play", "about"]:
+                    state.back_button_hover = back_button_layout().collidepoint(mouse_pos)
+                elif state.mode == "playing":
+                    redraw_requested = True   # the player sprite turns to face the cursor
+                if hovers != (state.play_button_hover, state.how_to_button_hover, state.about_button_hover, state.back_button_hover):
+                    redraw_requested = True
             
-            elif game_state == "playing" and maze_visible:
-                close_rect = draw_maze_puzzle(screen)
-                
-                # Check close button
-                if close_rect.collidepoint(mouse_pos):
-                    maze_visible = False
-        
-        elif event.type == pygame.KEYDOWN:
-            if game_state == "playing":
-                if maze_visible:
-                    # arrow keys move through the maze overlay
-                    handle_maze_input()
-                
-                elif safe_visible:
-                    # capture safe code input
-                    if event.unicode.isdigit() and len(safe_input) < 4:
-                        handle_safe_input(event.unicode)
-                    elif event.key == pygame.K_BACKSPACE:
-                        safe_input = safe_input[:-1]
-                    elif event.key == pygame.K_ESCAPE:
-                        safe_visible = False
-                
-                elif dialogue_active and event.key == pygame.K_SPACE:
-                    dialogue_index += 1
-                    if dialogue_index >= len(current_dialogue):
-                        dialogue_active = False
-                
-                elif upgrade_shop_visible:
-                    if event.key == pygame.K_ESCAPE:
-                        upgrade_shop_visible = False
-                
-                elif event.key == pygame.K_e:
-                    hud_visible = not hud_visible
-                
-                elif event.key == pygame.K_m:
-                    map_visible = not map_visible
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                if state.mode == "main_menu":
+                    play_button, how_to_button, about_button = main_menu_layout()
+                    if play_button.collidepoint(mouse_pos):
+                        state.mode = "playing"
+                    elif how_to_button.collidepoint(mouse_pos):
+                        state.mode = "how_to_play"
+                    elif about_button.collidepoint(mouse_pos):
+                        state.mode = "about"
                 
-                elif event.key == pygame.K_q:
-                    quest_log_visible = not quest_log_visible
+                elif state.mode in ["how_to_play", "about"]:
+                    if back_button_layout().collidepoint(mouse_pos):
+                        state.mode = "main_menu"
                 
-                elif event.key == pygame.K_h and inventory["Health Potions"] > 0 and health < max_health:
-                    inventory["Health Potions"] -= 1
-                    health = min(max_health, health + 30)
-                    set_message("+30 Health", (0, 255, 0), 1.5)
-                
-                elif event.key == pygame.K_f:
-                    handle_interaction()
+                elif state.mode == "playing" and state.upgrade_shop_visible:
+                    item_buttons, close_rect = blacksmith_shop_layout(state)
                     
-                elif event.key == pygame.K_t:
-                    enter_level_2()
-                
-                elif event.key == pygame.K_g:
-                    give_herbs_to_collector()
-                
-               
-                elif event.key == pygame.K_SPACE and not upgrade_shop_visible and not dialogue_active and not safe_visible and not maze_visible:
-                    if shoot_bullet():
-                        set_message("Pew!", (255, 255, 0), 0.5)
-                    elif not has_weapon:
-                        set_message("You need a weapon! Visit the blacksmith.", (255, 200, 0), 2.0)
-                    elif is_reloading:
-                        set_message("Reloading...", (255, 200, 0), 0.5)
-                    elif ammo == 0:
-                        set_message("Out of ammo! Buy more from blacksmith.", (255, 0, 0), 1.0)
-                
+                    for button_rect, item_id in item_buttons:
+                        if button_rect.collidepoint(mouse_pos):
+                            handle_blacksmith_purchase(state, item_id)
+                    
+                    if close_rect.collidepoint(mouse_pos):
+                        state.upgrade_shop_visible = False
                 
-                elif event.key == pygame.K_r and has_weapon and not is_reloading and ammo < max_ammo:
-                    is_reloading = True
-                    reload_time = 2.0
-                    set_message("Reloading...", (255, 200, 0), 1.0)
+                elif state.mode == "playing" and state.safe_visible:
+                    buttons, clear_rect, close_rect = safe_puzzle_layout(state)
+                    
+                    # Check number buttons
+                    for button_rect, number in buttons:
+                        if button_rect.collidepoint(mouse_pos):
+                            handle_safe_input(state, number)
+                    
+                    # Check clear button
+                    if clear_rect.collidepoint(mouse_pos):
+                        state.safe_input = ""
+                    
+                    # Check close button
+                    if close_rect.collidepoint(mouse_pos):
+                        state.safe_visible = False
                 
-                # esc to return to main menu
-                elif event.key == pygame.K_ESCAPE and not upgrade_shop_visible and not safe_visible and not maze_visible:
-                    game_state = "main_menu"
+                elif state.mode == "playing" and state.maze_visible:
+                    close_rect = maze_puzzle_layout(state)
+                    
+                    # Check close button
+                    if close_rect.collidepoint(mouse_pos):
+                        state.maze_visible = False
             
-            # Allow ESC to go back from how to play or about screens
-            elif event.key == pygame.K_ESCAPE and game_state in ["how_to_play", "about"]:
-                game_state = "main_menu"
-    
-    #
-    mouse_x, mouse_y = pygame.mouse.get_pos()
-    
-    #  SCREEN RENDERING 
-    # 
-    if game_state == "main_menu":
-        play_button, how_to_button, about_button = draw_main_menu()
-    
-    elif game_state == "how_to_play":
-        back_button = draw_how_to_play()
-    
-    elif game_state == "about":
-        back_button = draw_about()
-    
-    elif game_state == "playing":
-        #  GAMEPLAY 
-        
-        
-        if tuple(current_room) == (0, 2, 0) and not boss_initialized:
-            init_boss()
-            boss_initialized = True
-        
-
-        mv_x = (keys_pressed[pygame.K_d] or keys_pressed[pygame.K_RIGHT]) - (keys_pressed[pygame.K_a] or keys_pressed[pygame.K_LEFT])
-        mv_y = (keys_pressed[pygame.K_s] or keys_pressed[pygame.K_DOWN]) - (keys_pressed[pygame.K_w] or keys_pressed[pygame.K_UP])
-        
-       
-        if mouse_x > player.centerx + 10:  
-            player_direction = "right"
-        elif mouse_x < player.centerx - 10:
-            player_direction = "left"
-        
-        
-        if dialogue_active or hud_visible or quest_log_visible or upgrade_shop_visible or safe_visible or maze_visible:
-            mv_x, mv_y = 0, 0
-        
-       
-        player_speed_boost_timer = max(0.0, player_speed_boost_timer - (dt / 1000.0))
-        speed_bonus = 3 if player_speed_boost_timer > 0 else 0
-        dx, dy = mv_x * (player_speed + speed_bonus), mv_y * (player_speed + speed_bonus)
-        
-        # Update enemy movement before drawing the room
-        update_goblins(dt)
-        
-        # Update boss if in throne room
-        if tuple(current_room) == (0, 2, 0) and boss and boss["alive"]:
-            update_boss(dt)
-        
-        # Draw room
-        draw_room(screen, *current_room)
-        
-        # Movement & collision
-        collision_check(dx, dy)
-        room_transition()
-        
-        # Handle damage zones
-        handle_damage_zones(dt)
-        
-        # Check for player death
-        if health <= 0:
-            respawn_player()
-        
-        # Collect boss drops
-        if tuple(current_room) == (0, 2, 0) and boss_defeated and not boss_drop_collected:
-            collect_boss_drops()
-        
-        # Update weapon systems
-        if shoot_cooldown > 0:
-            shoot_cooldown = max(0, shoot_cooldown - dt / 1000.0)
-        
-        if is_reloading:
-            reload_time -= dt / 1000.0
-            if reload_time <= 0:
-                ammo = max_ammo
-                is_reloading = False
-                reload_time = 0.0
+            elif event.type == pygame.KEYDOWN:
+                if state.mode == "playing":
+                    if state.maze_visible:
+                        # arrow keys move through the maze overlay
+                        handle_maze_input(state)
+                    
+                    elif state.safe_visible:
+                        # capture safe code input
+                        if event.unicode.isdigit() and len(state.safe_input) < 4:
+                            handle_safe_input(state, event.unicode)
+                        elif event.key == pygame.K_BACKSPACE:
+                            state.safe_input = state.safe_input[:-1]
+                        elif event.key == pygame.K_ESCAPE:
+                            state.safe_visible = False
+                    
+                    elif state.dialogue_active and event.key == pygame.K_SPACE:
+                        state.dialogue_index += 1
+                        if state.dialogue_index >= len(state.current_dialogue):
+                            state.dialogue_active = False
+                    
+                    elif state.upgrade_shop_visible:
+                        if event.key == pygame.K_ESCAPE:
+                            state.upgrade_shop_visible = False
+                    
+                    elif event.key == pygame.K_e:
+                        state.hud_visible = not state.hud_visible
+                    
+                    elif event.key == pygame.K_m:
+                        state.map_visible = not state.map_visible
+                    
+                    elif event.key == pygame.K_q:
+                        state.quest_log_visible = not state.quest_log_visible
+                    
+                    elif event.key == pygame.K_h and state.inventory["Health Potions"] > 0 and state.health < state.max_health:
+                        state.inventory["Health Potions"] -= 1
+                        state.health = min(state.max_health, state.health + 30)
+                        set_message(state, "+30 Health", (0, 255, 0), 1.5)
+                    
+                    elif event.key == pygame.K_f:
+                        handle_interaction(state)
+                        
+                    elif event.key == pygame.K_t:
+                        enter_level_2(state)
+                    
+                    elif event.key == pygame.K_g:
+                        give_herbs_to_collector(state)
+                    
+                   
+                    elif event.key == pygame.K_SPACE and not state.upgrade_shop_visible and not state.dialogue_active and not state.safe_visible and not state.maze_visible:
+                        if shoot_bullet(state, mouse_pos):
+                            set_message(state, "Pew!", (255, 255, 0), 0.5)
+                        elif not state.has_weapon:
+                            set_message(state, "You need a weapon! Visit the blacksmith.", (255, 200, 0), 2.0)
+                        elif state.is_reloading:
+                            set_message(state, "Reloading...", (255, 200, 0), 0.5)
+                        elif state.ammo == 0:
+                            set_message(state, "Out of ammo! Buy more from blacksmith.", (255, 0, 0), 1.0)
+                    
+                    
+                    elif event.key == pygame.K_r and state.has_weapon and not state.is_reloading and state.ammo < max_ammo:
+                        state.is_reloading = True
+                        state.reload_time = 2.0
+                        set_message(state, "Reloading...", (255, 200, 0), 1.0)
+                    
+                    # esc to return to main menu
+                    elif event.key == pygame.K_ESCAPE and not state.upgrade_shop_visible and not state.safe_visible and not state.maze_visible:
+                        state.mode = "main_menu"
+                
+                # Allow ESC to go back from how to play or about screens
+                elif event.key == pygame.K_ESCAPE and state.mode in ["how_to_play", "about"]:
+                    state.mode = "main_menu"
         
-        update_bullets(dt)
+        if not redraw_requested:
+            continue
         
-       
-        pickup_items()
+        mouse_x, mouse_y = pygame.mouse.get_pos()
         
-       
-        draw_player(screen, player)
-        draw_player_pointer(screen, player)
+        #  SCREEN RENDERING 
+        # 
+        if state.mode == "main_menu":
+            draw_main_menu(state)
         
+        elif state.mode == "how_to_play":
+            draw_how_to_play(state)
         
-        draw_bullets(screen)
+        elif state.mode == "about":
+            draw_about(state)
         
-       
-        draw_health_bar(screen)
+        elif state.mode == "playing":
+            #  GAMEPLAY 
             
-        # Draw UI
-        draw_hud(screen) 
-        draw_minimap(screen, *current_room)
-        draw_quest_log(screen)
-        draw_message(screen)
-        draw_dialogue(screen)
-        draw_blacksmith_shop(screen)
-        draw_weapon_hud(screen)
-        
-        if DEV_MODE:
-            coord_surf = small_font.render(f"{player.x:.0f}, {player.y:.0f}", True, (255, 255, 0))
-            screen.blit(coord_surf, (10, ROOM_HEIGHT - 20))
-        if safe_visible:
-            buttons, clear_rect, close_rect = draw_safe_puzzle(screen)
-        
-        
-        if maze_visible:
-            close_rect = draw_maze_puzzle(screen)
-        
-       
-        near_object = False
-        for inter_obj in interactive_objects:
-            if player.colliderect(inter_obj["rect"].inflate(50, 50)):
-                near_object = True
-                break
-        for npc_rect in npcs:
-            if player.colliderect(npc_rect.inflate(50, 50)):
-                near_object = True
-                break
-        
-        if near_object and not dialogue_active and not upgrade_shop_visible and not safe_visible and not maze_visible:
-            hint = small_font.render("Press F to Interact", True, (255, 255, 255))
-            screen.blit(hint, (player.centerx - 40, player.top - 25))
+
+            mv_x = (keys_pressed[pygame.K_d] or keys_pressed[pygame.K_RIGHT]) - (keys_pressed[pygame.K_a] or keys_pressed[pygame.K_LEFT])
+            mv_y = (keys_pressed[pygame.K_s] or keys_pressed[pygame.K_DOWN]) - (keys_pressed[pygame.K_w] or keys_pressed[pygame.K_UP])
             
-            # Special hint for herb collector
-            room_key = tuple(current_room)
-            if room_key == (0, 2, 1):
-                for npc in room_data.get(room_key, {}).get("npcs", []):
-                    if npc["id"] == "herbcollector" and inventory["Herbs"] >= 3 and not quests["collect_herbs"]["complete"]:
-                        give_hint = small_font.render("Press G to Give Herbs", True, (0, 255, 0))
-                        screen.blit(give_hint, (player.centerx - 50, player.top - 45))
-        
+           
+            if mouse_x > state.player.centerx + 10:  
+                state.player_direction = "right"
+            elif mouse_x < state.player.centerx - 10:
+                state.player_direction = "left"
+            
+            
+            if state.dialogue_active or state.hud_visible or state.quest_log_visible or state.upgrade_shop_visible or state.safe_visible or state.maze_visible:
+                mv_x, mv_y = 0, 0
+            
+            # gameplay advances in fixed ticks; the frame only decides how many to run
+            run_simulation(state, dt, mv_x, mv_y)
+            state.active_room = get_room(state.current_room, state.knight_rescued)   # the last tick may have changed rooms
+
+            # start loading the next rooms' art as soon as we arrive somewhere new
+            if tuple(state.current_room) != state.previous_room:
+                state.previous_room = tuple(state.current_room)
+                pin_room_assets(*state.current_room)
+                prefetch_adjacent_rooms(*state.current_room)
+            
+            # Draw room
+            draw_room(state, screen, state.active_room)
+            draw_damage_border(state, screen)
+            
+           
+            player_draw_rect = interpolated_player_rect(state)
+            draw_player(state, screen, player_draw_rect)
+            draw_player_pointer(screen, player_draw_rect)
+            
+            
+            draw_bullets(state, screen)
+            
+           
+            draw_health_bar(state, screen)
+                
+            # Draw UI
+            draw_hud(state, screen) 
+            draw_minimap(state, screen, *state.current_room)
+            draw_quest_log(state, screen)
+            draw_message(state, screen)
+            draw_dialogue(state, screen)
+            draw_blacksmith_shop(state, screen)
+            draw_weapon_hud(state, screen)
+            
+            if DEV_MODE:
+                coord_surf = render_text(small_font, f"{state.player.x:.0f}, {state.player.y:.0f}", (255, 255, 0))
+                mark_dirty(screen.blit(coord_surf, (10, ROOM_HEIGHT - 20)))
+            if state.safe_visible:
+                buttons, clear_rect, close_rect = draw_safe_puzzle(state, screen)
+            
+            
+            if state.maze_visible:
+                close_rect = draw_maze_puzzle(state, screen)
+            
+           
+            if state.nearby_triggers and not state.dialogue_active and not state.upgrade_shop_visible and not state.safe_visible and not state.maze_visible:
+                hint = render_text(small_font, "Press F to Interact", (255, 255, 255))
+                mark_dirty(screen.blit(hint, (state.player.centerx - 40, state.player.top - 25)))
+                
+                # Special hint for herb collector
+                if state.inventory["Herbs"] >= 3 and not state.quests["collect_herbs"]["complete"] and nearest_trigger(state, "herbcollector"):
+                    give_hint = render_text(small_font, "Press G to Give Herbs", (0, 255, 0))
+                    mark_dirty(screen.blit(give_hint, (state.player.centerx - 50, state.player.top - 45)))
         
-        if message_timer > 0:
-            message_timer = max(0, message_timer - dt / 1000.0)
-    
-    pygame.display.flip()
+        present_frame()
+
+    if CACHE_STATS:
+        stats = image_cache.stats()
+        slowest = sorted(stats.pop("decode_ms").items(), key=lambda kv: -kv[1])[:5]
+        print("image cache:", stats)
+        print("slowest decodes (ms):", [(key, round(ms, 1)) for key, ms in slowest])
+
+    pygame.quit()
 
-pygame.quit()
+if __name__ == "__main__":
+    main()